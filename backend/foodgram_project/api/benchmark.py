@@ -0,0 +1,334 @@
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.catalogue import ingredient_index, tag_registry
+from api.views import IngredientViewSet, TagViewSet
+from ingredients.models import Ingredient, MeasurementUnit
+from recipes.models import (Recipe, RecipeIngredientAmount, RecipeTag,
+                            UserFavoriteRecipe, UserShoppingCart)
+from recipes.signals import COUNTERS as RECIPES_COUNTERS
+from tags.models import Tag
+from users.models import SubscribeUser
+from users.signals import COUNTERS as USERS_COUNTERS
+
+User = get_user_model()
+
+BENCHMARK_TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+BENCHMARK_UNITS = ('г', 'кг', 'мл', 'шт.', 'ст. л.')
+BENCHMARK_WORDS = (
+    'мука', 'сахар', 'масло', 'молоко', 'яйцо', 'соль', 'перец', 'лук',
+    'морковь', 'картофель', 'суп', 'курица', 'говядина', 'рис', 'сыр',
+)
+BENCHMARK_INGREDIENTS = 2000
+
+BENCHMARK_ENDPOINTS = (
+    ('recipes.list', '/api/recipes/?limit=10'),
+    ('recipes.list.deep_page', '/api/recipes/?limit=10&page={last_page}'),
+    ('recipes.list.cursor', '/api/recipes/?limit=10&cursor='),
+    ('recipes.list.tags', '/api/recipes/?limit=10&tags=breakfast'),
+    ('recipes.list.favorited', '/api/recipes/?limit=10&is_favorited=1'),
+    ('recipes.list.search', '/api/recipes/?limit=10&search=суп'),
+    ('recipes.retrieve', '/api/recipes/{recipe_id}/'),
+    ('recipes.download_shopping_cart',
+     '/api/recipes/download_shopping_cart/'),
+    ('users.subscriptions',
+     '/api/users/subscriptions/?limit=10&recipes_limit=3'),
+    ('ingredients.list', '/api/ingredients/'),
+    ('ingredients.name', '/api/ingredients/?name=мук'),
+    ('tags.list', '/api/tags/'),
+)
+
+
+class ZipfSampler:
+    '''
+    Класс ZipfSampler.
+
+    Выбирает элементы с вероятностью, обратно пропорциональной
+    степени их ранга: первые элементы популярнее остальных.
+    '''
+    def __init__(self, items, rng, exponent=1.1):
+        self.items = list(items)
+        self.rng = rng
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+
+    def one(self):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def distinct(self, count):
+        count = min(count, len(self.items))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(self.rng.choices(
+                self.items, cum_weights=self.cum_weights,
+                k=count - len(chosen),
+            ))
+        return chosen
+
+
+def bulk_insert(model, objs, chunk=1000):
+    '''
+    Вставляет объекты порциями, не собирая их все в памяти.
+    '''
+    objs = iter(objs)
+    while True:
+        batch = list(islice(objs, chunk))
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+def seed_catalogue():
+    '''
+    Создаёт единицы измерения, ингредиенты и теги, если справочники
+    пусты. Возвращает списки id ингредиентов и тегов.
+    '''
+    if not Ingredient.objects.exists():
+        MeasurementUnit.objects.bulk_create(
+            MeasurementUnit(name=name) for name in BENCHMARK_UNITS
+        )
+        units = list(MeasurementUnit.objects.values_list('id', flat=True))
+        Ingredient.objects.bulk_create(
+            Ingredient(
+                name=f'{BENCHMARK_WORDS[number % len(BENCHMARK_WORDS)]} '
+                     f'сорт {number}',
+                measurement_unit_id=units[number % len(units)],
+            )
+            for number in range(BENCHMARK_INGREDIENTS)
+        )
+    if not Tag.objects.exists():
+        Tag.objects.bulk_create(
+            Tag(name=name, slug=slug, color=color)
+            for name, slug, color in BENCHMARK_TAGS
+        )
+    return (
+        list(Ingredient.objects.values_list('id', flat=True)),
+        list(Tag.objects.values_list('id', flat=True)),
+    )
+
+
+def seed_benchmark_data(recipes, seed=0) -> dict:
+    '''
+    Заполняет базу recipes рецептами и связанными данными
+    с распределениями, похожими на рабочие: популярность авторов,
+    ингредиентов и рецептов подчиняется закону Ципфа.
+    Возвращает параметры для адресов BENCHMARK_ENDPOINTS.
+    '''
+    rng = random.Random(seed)
+    ingredient_ids, tags = seed_catalogue()
+    ingredients = ZipfSampler(ingredient_ids, rng)
+
+    User.objects.bulk_create(
+        User(
+            username=f'bench{number}', email=f'bench{number}@example.com',
+            first_name='Имя', last_name='Фамилия', password='!',
+        )
+        for number in range(max(recipes // 5, 10))
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith='bench')
+        .order_by('id').values_list('id', flat=True)
+    )
+    authors = ZipfSampler(user_ids, rng)
+
+    bulk_insert(Recipe, (
+        Recipe(
+            author_id=authors.one(),
+            name=f'{rng.choice(BENCHMARK_WORDS)} по-домашнему {number}',
+            text='Нарезать, смешать и готовить до готовности. ' * 5,
+            cooking_time=rng.randint(5, 120),
+            image='recipes/benchmark.png',
+        )
+        for number in range(recipes)
+    ))
+    recipe_ids = list(
+        Recipe.objects.filter(author_id__in=user_ids)
+        .order_by('id').values_list('id', flat=True)
+    )
+    popular = ZipfSampler(recipe_ids, rng)
+
+    bulk_insert(RecipeTag, (
+        RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(tags, rng.randint(1, len(tags)))
+    ))
+    bulk_insert(RecipeIngredientAmount, (
+        RecipeIngredientAmount(
+            recipe_id=recipe_id, ingredient_id=ingredient_id,
+            amount=rng.randint(1, 500),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in ingredients.distinct(rng.randint(3, 10))
+    ))
+
+    viewer = user_ids[-1]
+    for model, average in ((UserFavoriteRecipe, 10), (UserShoppingCart, 3)):
+        bulk_insert(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in popular.distinct(
+                10 if user_id == viewer else rng.randint(0, 2 * average)
+            )
+        ))
+    bulk_insert(SubscribeUser, (
+        SubscribeUser(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in authors.distinct(
+            10 if user_id == viewer else rng.randint(0, 10)
+        ) if author_id != user_id
+    ))
+
+    for counter in RECIPES_COUNTERS + USERS_COUNTERS:
+        counter.recompute()
+    cache.clear()
+    return {
+        'viewer': User.objects.get(pk=viewer),
+        'recipe_id': popular.items[0],
+        'last_page': max(recipes // 10, 1),
+    }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def reset_process_caches():
+    '''
+    Очищает кэш и всё, что процесс держит в памяти на его версиях:
+    теги, индекс ингредиентов и заранее отрендеренные справочники.
+    '''
+    cache.clear()
+    tag_registry.reset()
+    ingredient_index.reset()
+    for viewset in (IngredientViewSet, TagViewSet):
+        viewset.prerendered_body.reset()
+
+
+def counted_get(client, url):
+    '''
+    Возвращает ответ и число запросов к базе.
+    '''
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    return response, len(queries)
+
+
+def timed_get(client, url) -> float:
+    started = time.perf_counter()
+    client.get(url)
+    return (time.perf_counter() - started) * 1000
+
+
+def summarize(prefix, timings) -> dict:
+    return {
+        f'{prefix}_p50_ms': round(percentile(timings, 0.5), 3),
+        f'{prefix}_p90_ms': round(percentile(timings, 0.9), 3),
+        f'{prefix}_p99_ms': round(percentile(timings, 0.99), 3),
+        f'{prefix}_mean_ms': round(sum(timings) / len(timings), 3),
+    }
+
+
+def measure_endpoint(client, url, repeat) -> dict:
+    '''
+    Замеряет время ответа на холодных кэшах (перед каждым запросом
+    кэши сбрасываются) и на тёплых, число запросов к базе в обоих
+    случаях и пиковый расход памяти на один запрос.
+    '''
+    reset_process_caches()
+    response, query_count = counted_get(client, url)
+    warm_query_count = counted_get(client, url)[1]
+    cold = []
+    for _ in range(repeat):
+        reset_process_caches()
+        cold.append(timed_get(client, url))
+    warm = [timed_get(client, url) for _ in range(repeat)]
+    tracemalloc.start()
+    try:
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'status': response.status_code,
+        'queries': query_count,
+        'warm_queries': warm_query_count,
+        **summarize('cold', cold),
+        **summarize('warm', warm),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def benchmark_scale(recipes, repeat=20, seed=0) -> dict:
+    '''
+    Заполняет базу для масштаба recipes и замеряет все адреса
+    BENCHMARK_ENDPOINTS от имени пользователя с подписками,
+    избранным и списком покупок.
+    '''
+    params = seed_benchmark_data(recipes, seed)
+    client = APIClient()
+    client.force_authenticate(params.pop('viewer'))
+    return {
+        name: measure_endpoint(client, url.format(**params), repeat)
+        for name, url in BENCHMARK_ENDPOINTS
+    }
+
+
+def benchmark_meta() -> dict:
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+    }
+
+
+def compare_reports(report, baseline, tolerance=1.25,
+                    min_delta_ms=1.0) -> list:
+    '''
+    Возвращает описания регрессий: медиана времени на холодных или
+    тёплых кэшах выросла больше, чем в tolerance раз и больше чем
+    на min_delta_ms, или запросов к базе стало больше.
+    '''
+    regressions = []
+    for scale, endpoints in report['scales'].items():
+        base_endpoints = baseline.get('scales', {}).get(scale, {})
+        for name, result in endpoints.items():
+            base = base_endpoints.get(name)
+            if base is None:
+                continue
+            regressions.extend(
+                f'{scale} {name}: {message}'
+                for message in compare_results(
+                    result, base, tolerance, min_delta_ms
+                )
+            )
+    return regressions
+
+
+def compare_results(result, base, tolerance, min_delta_ms):
+    for key in ('cold_p50_ms', 'warm_p50_ms'):
+        if key not in base:
+            continue
+        if (result[key] > base[key] * tolerance
+                and result[key] - base[key] > min_delta_ms):
+            yield f'{key[:-3]} {base[key]} -> {result[key]} ms'
+    for key in ('queries', 'warm_queries'):
+        if key in base and result[key] > base[key]:
+            yield f'{key} {base[key]} -> {result[key]}'
@@ -0,0 +1,264 @@
+import logging
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+from threading import Lock, Thread
+
+from django.db import DatabaseError, connection
+
+from api.search import TRIGRAM_THRESHOLD, WORD_RE, fuzzy_limit, trigrams
+from api.versions import get_versions
+from foodgram_project.settings import PROJECT_SETTINGS
+from ingredients.models import Ingredient, MeasurementUnit
+from tags.models import Tag
+
+logger = logging.getLogger(__name__)
+
+
+class TagRegistry:
+    '''
+    Класс TagRegistry.
+
+    Соответствие slug -> id тегов, хранящееся в памяти процесса.
+    Перечитывается из базы, только когда изменился счётчик
+    изменений модели Tag.
+    '''
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        '''
+        Забывает прочитанные теги: следующий вызов перечитает базу.
+        '''
+        self._version = None
+        self._ids = {}
+
+    def _snapshot(self) -> dict:
+        version = get_versions(Tag)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._ids = dict(Tag.objects.values_list('slug', 'id'))
+                    self._version = version
+        return self._ids
+
+    def choices(self):
+        return [(slug, slug) for slug in sorted(self._snapshot())]
+
+    def ids_for(self, slugs) -> list:
+        ids = self._snapshot()
+        return [ids[slug] for slug in slugs if slug in ids]
+
+    def known_ids(self) -> set:
+        return set(self._snapshot().values())
+
+
+tag_registry = TagRegistry()
+
+
+def tag_choices():
+    return tag_registry.choices()
+
+
+IndexSnapshot = namedtuple(
+    'IndexSnapshot', ('version', 'keys', 'items', 'postings', 'sizes')
+)
+
+
+class IngredientIndex:
+    '''
+    Класс IngredientIndex.
+
+    Отсортированный список названий ингредиентов в нижнем регистре
+    для подсказок при вводе. Совпадения по началу названия ищутся
+    бинарным поиском, затем добавляются совпадения внутри названия.
+    Для нечёткого поиска хранится обратный индекс триграмм.
+    Совпадения внутри названия берутся из того же обратного
+    индекса и проверяются подстрокой.
+    Индекс перестраивается, когда меняются Ingredient или
+    MeasurementUnit; пока он строится, поиск возвращает None,
+    и запрос обслуживает база. В воркере индекс строится при
+    запуске (warm), а затем перестраивается в отдельном потоке;
+    без warm (тесты, команды manage.py) он строится в запросе.
+    '''
+    def __init__(self):
+        self._lock = Lock()
+        self.background = False
+        self.reset()
+
+    def reset(self):
+        '''
+        Забывает построенный индекс: следующий поиск построит его
+        заново.
+        '''
+        self._data = IndexSnapshot(None, [], [], {}, array('I'))
+
+    def _build(self, version):
+        rows = sorted(
+            Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit__name'
+            ),
+            key=lambda row: (row[1].lower(), row[0]),
+        )
+        keys = [name.lower() for _, name, _ in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in rows
+        ]
+        postings = defaultdict(list)
+        sizes = array('I')
+        for position, key in enumerate(keys):
+            grams = trigrams(key)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(position)
+        self._data = IndexSnapshot(
+            version, keys, items,
+            {gram: array('I', found) for gram, found in postings.items()},
+            sizes,
+        )
+
+    def _snapshot(self):
+        version = get_versions(Ingredient, MeasurementUnit)
+        data = self._data
+        if data.version == version:
+            return data
+        if self.background:
+            if not self._lock.locked():
+                Thread(
+                    target=self.refresh_in_thread, daemon=True,
+                    name='ingredient-index',
+                ).start()
+            return None
+        if not self.refresh(version):
+            return None
+        return self._data
+
+    def refresh(self, version=None) -> bool:
+        '''
+        Перестраивает устаревший индекс. Возвращает False, если его
+        уже перестраивает другой поток.
+        '''
+        if version is None:
+            version = get_versions(Ingredient, MeasurementUnit)
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._data.version != version:
+                self._build(version)
+        finally:
+            self._lock.release()
+        return True
+
+    def refresh_in_thread(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception('Ingredient index build failed')
+        finally:
+            connection.close()
+
+    def warm(self):
+        '''
+        Строит индекс при запуске воркера и включает перестроение
+        в отдельном потоке.
+        '''
+        self.background = True
+        try:
+            self.refresh()
+        except DatabaseError:
+            logger.exception('Ingredient index warm-up failed')
+
+    def substring_candidates(self, data, needle):
+        '''
+        Позиции названий, которые могут содержать needle, по обратному
+        индексу триграмм: для длинных needle - названия со всеми его
+        триграммами, для коротких - с триграммами, содержащими needle.
+        None, если needle так не отобрать (в нём есть не буквы).
+        '''
+        if len(needle) < 3:
+            if not WORD_RE.fullmatch(needle):
+                return None
+            found = set()
+            for gram, positions in data.postings.items():
+                if needle in gram:
+                    found.update(positions)
+            return found
+        grams = {
+            needle[i:i + 3] for i in range(len(needle) - 2)
+            if WORD_RE.fullmatch(needle[i:i + 3])
+        }
+        if not grams:
+            return None
+        postings = sorted(
+            (data.postings.get(gram, ()) for gram in grams), key=len
+        )
+        found = set(postings[0])
+        for positions in postings[1:]:
+            found.intersection_update(positions)
+        return found
+
+    def search(self, value, limit=None):
+        '''
+        Возвращает ингредиенты, название которых начинается с value,
+        а за ними те, где value встречается внутри названия.
+        '''
+        data = self._snapshot()
+        if data is None:
+            return None
+        keys, items = data.keys, data.items
+        needle = value.lower()
+        found = []
+        position = bisect_left(keys, needle)
+        while position < len(keys) and keys[position].startswith(needle):
+            found.append(items[position])
+            position += 1
+        if not needle or (limit and len(found) >= limit):
+            return found[:limit]
+        candidates = self.substring_candidates(data, needle)
+        if candidates is None:
+            candidates = range(len(keys))
+        for position in sorted(candidates):
+            key = keys[position]
+            if needle in key and not key.startswith(needle):
+                found.append(items[position])
+                if limit and len(found) >= limit:
+                    break
+        return found
+
+    def fuzzy(self, value, limit=None):
+        '''
+        Возвращает ингредиенты, похожие на value по триграммам:
+        сначала совпадения по началу названия, затем по убыванию
+        сходства.
+        '''
+        data = self._snapshot()
+        if data is None:
+            return None
+        query = trigrams(value)
+        shared = Counter()
+        for gram in query:
+            shared.update(data.postings.get(gram, ()))
+        needle = value.lower()
+        ranked = []
+        for position, common in shared.items():
+            score = common / (len(query) + data.sizes[position] - common)
+            if score > TRIGRAM_THRESHOLD:
+                prefix = data.keys[position].startswith(needle)
+                ranked.append((not prefix, -score, position))
+        ranked.sort()
+        limit = min(limit or fuzzy_limit(), fuzzy_limit())
+        return [data.items[position] for *_, position in ranked[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+
+def ingredient_index_enabled() -> bool:
+    return bool(PROJECT_SETTINGS.get('ingredient_index'))
+
+
+def warm_ingredient_index():
+    if ingredient_index_enabled():
+        ingredient_index.warm()
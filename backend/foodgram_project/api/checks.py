@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from django.core.exceptions import ImproperlyConfigured
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+SHARED_CACHE_MESSAGE = (
+    'CACHE_BACKEND must be shared between processes (memcached or '
+    'DatabaseCache) when DEBUG is off: versions of data, ETag and '
+    'cached recipes are kept in the cache.'
+)
+
+
+def shared_cache_missing() -> bool:
+    '''
+    Счётчики изменений (api.versions) и всё, что на них построено,
+    работают, только если кэш общий для всех процессов: воркеров
+    gunicorn, команд manage.py и админки.
+    '''
+    backend = settings.CACHES['default']['BACKEND']
+    return not settings.DEBUG and backend in PROCESS_LOCAL_CACHES
+
+
+def require_shared_cache():
+    '''
+    Не даёт запустить сервер без общего кэша.
+    '''
+    if shared_cache_missing():
+        raise ImproperlyConfigured(SHARED_CACHE_MESSAGE)
+
+
+@register('caches', deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if shared_cache_missing():
+        return [Error(SHARED_CACHE_MESSAGE, id='api.E001')]
+    return []
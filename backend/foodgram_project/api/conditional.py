@@ -0,0 +1,116 @@
+import math
+import time
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from api.versions import get_last_modified, get_versions
+
+
+class NotModifiedError(Exception):
+    '''
+    Класс NotModifiedError.
+
+    Прерывает обработку запроса готовым ответом 304.
+    '''
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    '''
+    Класс ConditionalGetMixin для list и retrieve.
+
+    ETag строится из счётчиков изменений моделей conditional_models,
+    адреса запроса и, если conditional_per_user, пользователя.
+    Совпавшие If-None-Match или If-Modified-Since дают ответ 304
+    до выполнения запросов к базе и сериализации. Ответ в другом
+    кодировании (Content-Encoding) получает ETag с его суффиксом.
+    Last-Modified отдаётся с точностью до секунды, поэтому только
+    после того, как секунда последнего изменения закончилась:
+    иначе второе изменение в ту же секунду не сменило бы его.
+    '''
+    conditional_actions = ('list', 'retrieve')
+    conditional_models = ()
+    conditional_per_user = False
+    conditional_etag = None
+    conditional_encoding = None
+    conditional_last_modified = None
+
+    def get_conditional_etag(self, request) -> str:
+        parts = [
+            type(self).__name__,
+            request.get_full_path(),
+            request.accepted_media_type,
+            *get_versions(*self.conditional_models),
+        ]
+        if self.conditional_per_user:
+            parts.append(request.user.pk)
+        digest = md5(repr(parts).encode('utf-8')).hexdigest()
+        return f'"{digest}"'
+
+    def get_conditional_encoding(self, request):
+        '''
+        Content-Encoding, в котором будет отдан ответ, или None.
+        '''
+
+    def encoded_etag(self, encoding) -> str:
+        if not encoding:
+            return self.conditional_etag
+        return f'{self.conditional_etag[:-1]}-{encoding}"'
+
+    def get_conditional_last_modified(self):
+        '''
+        Время последнего изменения, округлённое вверх до секунды,
+        или None, если оно неизвестно или эта секунда не закончилась.
+        '''
+        last_modified = get_last_modified(*self.conditional_models)
+        if last_modified is None:
+            return None
+        last_modified = math.ceil(last_modified)
+        if last_modified > time.time():
+            return None
+        return last_modified
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action not in self.conditional_actions:
+            return
+        self.conditional_etag = self.get_conditional_etag(request)
+        self.conditional_encoding = self.get_conditional_encoding(request)
+        self.conditional_last_modified = (
+            self.get_conditional_last_modified()
+        )
+        not_modified = get_conditional_response(
+            request,
+            etag=self.encoded_etag(self.conditional_encoding),
+            last_modified=self.conditional_last_modified,
+        )
+        if not_modified is not None:
+            raise NotModifiedError(not_modified)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModifiedError):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.conditional_etag is None:
+            return response
+        if response.status_code in (200, 304):
+            encoding = self.conditional_encoding
+            if response.status_code == 200:
+                encoding = response.get('Content-Encoding')
+            response['ETag'] = self.encoded_etag(encoding)
+            if self.conditional_last_modified is not None:
+                response['Last-Modified'] = http_date(
+                    self.conditional_last_modified
+                )
+            if self.conditional_per_user:
+                patch_vary_headers(response, ('Authorization',))
+        return response
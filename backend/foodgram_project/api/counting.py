@@ -0,0 +1,92 @@
+import json
+from hashlib import md5
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from api.metrics import record_cache
+from api.versions import get_versions
+from foodgram_project.settings import PROJECT_SETTINGS
+from recipes.models import (Recipe, RecipeTag, UserFavoriteRecipe,
+                            UserShoppingCart)
+from users.models import SubscribeUser
+
+User = get_user_model()
+
+COUNTED_MODELS = (
+    Recipe,
+    RecipeTag,
+    UserFavoriteRecipe,
+    UserShoppingCart,
+    User,
+    SubscribeUser,
+)
+
+
+def count_queryset(queryset):
+    '''
+    Возвращает пару (число строк, точное ли оно).
+
+    Точное значение кэшируется по SQL запроса и версиям моделей,
+    поэтому любая запись в рецепты, избранное или корзину делает
+    его недействительным. Пока точного значения в кэше нет, а оценка
+    планировщика превышает порог pagination_estimate_threshold,
+    возвращается оценка.
+    '''
+    timeout = PROJECT_SETTINGS.get('pagination_count_cache_timeout')
+    key = count_cache_key(queryset) if timeout else None
+    if key is not None:
+        value = cache.get(key)
+        record_cache('pagination_count', value is not None, value is None)
+        if value is not None:
+            return value, True
+
+    threshold = PROJECT_SETTINGS.get('pagination_estimate_threshold')
+    if threshold:
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate > threshold:
+            return estimate, False
+
+    value = queryset.count()
+    if key is not None:
+        cache.set(key, value, timeout)
+    return value, True
+
+
+def count_cache_key(queryset) -> str:
+    sql, params = queryset.order_by().query.sql_with_params()
+    signature = repr((queryset.db, sql, params, get_versions(*COUNTED_MODELS)))
+    return 'pagination-count:' + md5(signature.encode('utf-8')).hexdigest()
+
+
+def estimate_count(queryset):
+    '''
+    Оценка числа строк по плану запроса. Доступна только в PostgreSQL.
+    '''
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class CountingPaginator(Paginator):
+    '''
+    Класс CountingPaginator считает число объектов через count_queryset.
+    '''
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        value, self.count_is_exact = count_queryset(self.object_list)
+        return value
@@ -1,15 +1,27 @@
+from django.db.models import Exists, OuterRef
 from django_filters import FilterSet, rest_framework
-from tags.models import Tag
+
+from api.catalogue import tag_choices, tag_registry
+from api.search import (fuzzy_ingredients, search_ingredients,
+                        search_recipes)
+from recipes.models import RecipeTag
 
 
 class IngredientFilter(FilterSet):
     '''
     Класс IngredientFilter.
     '''
-    name = rest_framework.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
-    )
+    name = rest_framework.CharFilter(method='get_name_filter')
+
+    def get_name_filter(self, queryset, name, value):
+        '''
+        Возвращает ингредиенты, название которых начинается с value,
+        а за ними те, где value встречается внутри названия.
+        С параметром fuzzy=1 ищет похожие названия по триграммам.
+        '''
+        if self.data.get('fuzzy') == '1':
+            return fuzzy_ingredients(queryset, value)
+        return search_ingredients(queryset, value)
 
 
 class RecipeFilter(FilterSet):
@@ -25,12 +37,33 @@ class RecipeFilter(FilterSet):
         method='get_in_shopping_cart_filter'
     )
 
-    tags = rest_framework.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
+    search = rest_framework.CharFilter(method='get_search_filter')
+
+    tags = rest_framework.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='get_tags_filter',
     )
 
+    def get_search_filter(self, queryset, name, value):
+        '''
+        Возвращает рецепты, найденные по названию и описанию.
+        '''
+        return search_recipes(queryset, value)
+
+    def get_tags_filter(self, queryset, name, value):
+        '''
+        Возвращает рецепты, у которых есть хотя бы один из тегов.
+        Полусоединение через EXISTS не размножает строки рецептов,
+        а слаги переводятся в id без запроса к таблице тегов.
+        '''
+        recipe_tags = RecipeTag.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=tag_registry.ids_for(value),
+        )
+        return queryset.annotate(
+            has_tags=Exists(recipe_tags)
+        ).filter(has_tags=True)
+
     def get_favorited_filter(self, queryset, name, value):
         '''
         Возвращает отфильтрованный queryset модели Recipe,
@@ -0,0 +1,140 @@
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from api.metrics import record_cache
+from api.resolvers import ViewerStateResolver
+from api.serializers import ResipeSerializer
+from api.timing import timed
+from api.versions import get_versions
+from foodgram_project.settings import PROJECT_SETTINGS
+from ingredients.models import Ingredient, MeasurementUnit
+from recipes.models import Recipe, RecipeIngredientAmount, RecipeTag
+from tags.models import Tag
+
+FRAGMENT_VERSION = 1
+CATALOGUE_MODELS = (Tag, Ingredient, MeasurementUnit)
+# Модели, из которых собирается фрагмент: если их версии изменились,
+# пока фрагменты строились, собранные данные могли устареть.
+SOURCE_MODELS = (Recipe, RecipeTag, RecipeIngredientAmount, get_user_model())
+
+
+def fragments_enabled() -> bool:
+    return bool(PROJECT_SETTINGS.get('recipe_fragment_cache'))
+
+
+def fragment_keys(recipe_ids) -> dict:
+    '''
+    Ключи кэша для рецептов. Версии справочников входят в ключ,
+    поэтому изменение тега или ингредиента делает недействительными
+    все фрагменты сразу.
+    '''
+    catalogue = '.'.join(str(v) for v in get_versions(*CATALOGUE_MODELS))
+    prefix = f'recipe-fragment:{FRAGMENT_VERSION}:{catalogue}'
+    return {recipe_id: f'{prefix}:{recipe_id}' for recipe_id in recipe_ids}
+
+
+def get_fragments(recipe_ids) -> dict:
+    keys = fragment_keys(recipe_ids)
+    cached = cache.get_many(keys.values())
+    record_cache('recipe_fragments', len(cached), len(keys) - len(cached))
+    return {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items() if key in cached
+    }
+
+
+def set_fragments(fragments: dict):
+    keys = fragment_keys(fragments)
+    cache.set_many(
+        {keys[recipe_id]: data for recipe_id, data in fragments.items()},
+        PROJECT_SETTINGS.get('recipe_fragment_cache_timeout'),
+    )
+
+
+def serialize_fragments(queryset) -> dict:
+    '''
+    Фрагменты рецептов queryset, собранные ResipeSerializer без request.
+    '''
+    return {
+        item['id']: item
+        for item in ResipeSerializer(queryset, many=True).data
+    }
+
+
+def invalidate_fragments(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        cache.delete_many(fragment_keys(recipe_ids).values())
+
+
+class RecipeFragmentRenderer:
+    '''
+    Класс RecipeFragmentRenderer.
+
+    Собирает представление рецептов из фрагментов: общая для всех
+    пользователей часть ResipeSerializer хранится в кэше (если
+    use_cache), а флаги is_favorited, is_in_shopping_cart
+    и author.is_subscribed накладываются для текущего запроса.
+    '''
+    def __init__(self, context, use_cache=True):
+        self.request = context.get('request')
+        self.viewer_state = ViewerStateResolver.from_context(context)
+        self.use_cache = use_cache
+
+    def render(self, recipes, build_fragments):
+        '''
+        recipes - рецепты страницы, нужны только id и author_id;
+        build_fragments - функция, которая по списку id возвращает
+        словарь id -> фрагмент для рецептов, которых нет в кэше.
+        '''
+        with timed('serialize'):
+            recipes = list(recipes)
+            fragments = {}
+            if self.use_cache:
+                fragments = get_fragments(recipe.pk for recipe in recipes)
+            missing = [
+                recipe.pk for recipe in recipes if recipe.pk not in fragments
+            ]
+            if missing:
+                fresh = self.build(missing, build_fragments)
+                fragments.update(fresh)
+
+            self.viewer_state.add_recipes(recipes)
+            return [
+                self.overlay(fragments[recipe.pk], recipe)
+                for recipe in recipes if recipe.pk in fragments
+            ]
+
+    def build(self, recipe_ids, build_fragments) -> dict:
+        '''
+        Строит недостающие фрагменты и кладёт их в кэш, только если
+        за время сборки исходные модели не менялись: иначе запись,
+        зафиксированная во время чтения, уже сбросила кэш, и старые
+        данные легли бы в него снова.
+        '''
+        if not self.use_cache:
+            return build_fragments(recipe_ids)
+        versions = get_versions(*SOURCE_MODELS)
+        fresh = build_fragments(recipe_ids)
+        if get_versions(*SOURCE_MODELS) == versions:
+            set_fragments(fresh)
+        return fresh
+
+    def overlay(self, fragment, recipe):
+        data = OrderedDict(fragment)
+        data['is_favorited'] = self.viewer_state.is_favorited(recipe)
+        data['is_in_shopping_cart'] = (
+            self.viewer_state.is_in_shopping_cart(recipe)
+        )
+        data['author'] = OrderedDict(fragment['author'])
+        data['author']['is_subscribed'] = (
+            self.viewer_state.author_is_subscribed(recipe)
+        )
+        if self.request is not None and data['image']:
+            with timed('images'):
+                data['image'] = self.request.build_absolute_uri(
+                    data['image']
+                )
+        return data
@@ -0,0 +1,240 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from uuid import uuid4
+
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from foodgram_project.settings import PROJECT_SETTINGS
+from recipes.models import (IMAGE_FAILED, IMAGE_PENDING, IMAGE_READY,
+                            Recipe)
+from recipes.signals import bulk_changed
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'BMP': 'bmp',
+    'WEBP': 'webp',
+}
+PILLOW_FORMATS = tuple(IMAGE_FORMATS)
+BROKEN_IMAGE_ERRORS = (
+    OSError, SyntaxError, ValueError, Image.DecompressionBombError,
+)
+
+
+def too_many_pixels(image) -> bool:
+    width, height = image.size
+    return width * height > PROJECT_SETTINGS.get('image_max_pixels')
+
+
+def inspect_image(content):
+    '''
+    Читает заголовок картинки и проверяет её структуру без
+    декодирования точек. Возвращает (расширение, число точек)
+    или None, если это не картинка допустимого формата.
+    '''
+    try:
+        with Image.open(BytesIO(content), formats=PILLOW_FORMATS) as image:
+            extension = IMAGE_FORMATS[image.format]
+            width, height = image.size
+            image.verify()
+    except BROKEN_IMAGE_ERRORS:
+        return None
+    return extension, width * height
+
+
+def encode_jpeg(image) -> bytes:
+    buffer = BytesIO()
+    image.save(
+        buffer, 'JPEG', quality=PROJECT_SETTINGS.get('image_quality'),
+        optimize=True,
+    )
+    return buffer.getvalue()
+
+
+def flatten(image):
+    '''
+    Картинка в RGB; прозрачные участки становятся белыми.
+    '''
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_image(content):
+    '''
+    Декодирует загруженную картинку и возвращает (картинка,
+    миниатюра) в JPEG или None, если файл битый или в нём больше
+    image_max_pixels точек. Размер проверяется до декодирования,
+    а JPEG сразу декодируется с уменьшением (draft).
+    '''
+    side = PROJECT_SETTINGS.get('image_max_side')
+    try:
+        with Image.open(BytesIO(content), formats=PILLOW_FORMATS) as image:
+            if too_many_pixels(image):
+                return None
+            if image.format == 'JPEG':
+                image.draft('RGB', (side, side))
+            image = flatten(ImageOps.exif_transpose(image))
+    except BROKEN_IMAGE_ERRORS:
+        return None
+    image.thumbnail((side, side), Image.LANCZOS)
+    full = encode_jpeg(image)
+    side = PROJECT_SETTINGS.get('image_thumbnail_side')
+    image.thumbnail((side, side), Image.LANCZOS)
+    return full, encode_jpeg(image)
+
+
+def save_file(field, content) -> str:
+    '''
+    Сохраняет content в хранилище поля field модели Recipe
+    под новым именем и возвращает его.
+    '''
+    field = Recipe._meta.get_field(field)
+    name = field.generate_filename(None, f'{uuid4().hex}.jpg')
+    return field.storage.save(name, ContentFile(content))
+
+
+def delete_files(*names):
+    storage = Recipe._meta.get_field('image').storage
+    for name in names:
+        if name:
+            storage.delete(name)
+
+
+def delete_unused_files(*names):
+    '''
+    Удаляет файлы картинок, на которые больше не ссылается ни один
+    рецепт (рецепты generate_load_data делят одну картинку).
+    '''
+    for name in names:
+        if name and not Recipe.objects.filter(
+            Q(image=name) | Q(image_thumbnail=name)
+        ).exists():
+            delete_files(name)
+
+
+@contextmanager
+def saved_upload(field, upload):
+    '''
+    Сохраняет загруженный файл upload в хранилище поля field модели
+    Recipe до записи в базу и отдаёт его имя. Если блок завершился
+    исключением, в том числе откатом транзакции, файл удаляется.
+    '''
+    if upload is None:
+        yield None
+        return
+    field = Recipe._meta.get_field(field)
+    name = field.storage.save(
+        field.generate_filename(None, upload.name), upload
+    )
+    try:
+        yield name
+    except BaseException:
+        delete_files(name)
+        raise
+
+
+def process_recipe_image(recipe_id):
+    '''
+    Обрабатывает загруженную картинку рецепта recipe_id, если она
+    ждёт обработки. Возвращает новое состояние или None.
+
+    Результат записывается, только если за время обработки
+    картинку не заменили: иначе файлы удаляются, а новой картинкой
+    займётся её собственная задача. Файлы прежней картинки
+    удаляются после записи.
+    '''
+    recipe = Recipe.objects.filter(
+        pk=recipe_id, image_state=IMAGE_PENDING
+    ).only('image_raw', 'image', 'image_thumbnail').first()
+    if recipe is None or not recipe.image_raw:
+        return None
+    raw = recipe.image_raw.name
+    previous = (recipe.image.name, recipe.image_thumbnail.name)
+    try:
+        with recipe.image_raw.open('rb') as f:
+            images = render_image(f.read())
+    except OSError:
+        images = None
+
+    updates = {'image_raw': '', 'image_state': IMAGE_FAILED}
+    if images is not None:
+        updates.update(
+            image=save_file('image', images[0]),
+            image_thumbnail=save_file('image_thumbnail', images[1]),
+            image_state=IMAGE_READY,
+        )
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image_raw=raw, image_state=IMAGE_PENDING
+    ).update(**updates)
+    if not updated:
+        delete_files(updates.get('image'), updates.get('image_thumbnail'))
+        return None
+    delete_files(raw)
+    if images is not None:
+        transaction.on_commit(lambda: delete_unused_files(*previous))
+    bulk_changed.send(sender=Recipe, recipe_ids=(recipe_id,))
+    return updates['image_state']
+
+
+def process_in_thread(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Recipe %s image processing failed', recipe_id)
+    finally:
+        connection.close()
+
+
+class ImagePipeline:
+    '''
+    Класс ImagePipeline.
+
+    Обрабатывает загруженные картинки рецептов в пуле из
+    image_workers потоков процесса (воркера gunicorn): задача
+    ставится после фиксации транзакции, в которой сохранён
+    исходный файл. При image_workers = 0 картинка обрабатывается
+    сразу в запросе. Картинки, которые не успели обработать
+    до остановки процесса, остаются в состоянии pending: их
+    дообрабатывает команда process_recipe_images.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                # Пул, унаследованный через fork, в дочернем процессе
+                # не работает.
+                self.pid = os.getpid()
+                self.executor = ThreadPoolExecutor(
+                    max_workers=PROJECT_SETTINGS.get('image_workers'),
+                    thread_name_prefix='recipe-images',
+                )
+            return self.executor
+
+    def submit(self, recipe_id):
+        if not PROJECT_SETTINGS.get('image_workers'):
+            process_recipe_image(recipe_id)
+            return
+        transaction.on_commit(
+            lambda: self.get_executor().submit(process_in_thread, recipe_id)
+        )
+
+
+image_pipeline = ImagePipeline()
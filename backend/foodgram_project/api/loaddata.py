@@ -0,0 +1,255 @@
+import random
+import time
+from io import StringIO
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from api.benchmark import BENCHMARK_WORDS, ZipfSampler, seed_catalogue
+from api.versions import bump_versions
+from recipes.models import (Recipe, RecipeIngredientAmount, RecipeTag,
+                            UserFavoriteRecipe, UserShoppingCart)
+from recipes.signals import COUNTERS as RECIPES_COUNTERS
+from users.models import SubscribeUser
+from users.signals import COUNTERS as USERS_COUNTERS
+
+User = get_user_model()
+
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r',
+})
+
+LOAD_MODELS = (
+    User,
+    Recipe,
+    RecipeTag,
+    RecipeIngredientAmount,
+    UserFavoriteRecipe,
+    UserShoppingCart,
+    SubscribeUser,
+)
+
+
+def copy_value(value) -> str:
+    '''
+    Значение поля в текстовом формате COPY.
+    '''
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).translate(COPY_ESCAPES)
+
+
+class TableWriter:
+    '''
+    Класс TableWriter.
+
+    Пишет в таблицу модели строки-кортежи значений columns, минуя
+    создание объектов модели: остальные поля берутся из значений
+    по умолчанию, подготовленных один раз. В PostgreSQL строки
+    передаются командой COPY, в остальных базах - executemany.
+    '''
+    def __init__(self, model, columns):
+        template = model()
+        fields = [
+            field for field in model._meta.concrete_fields
+            if field.attname in columns or not field.primary_key
+        ]
+        self.defaults = [
+            field.get_db_prep_save(field.pre_save(template, True), connection)
+            for field in fields
+        ]
+        attnames = [field.attname for field in fields]
+        self.positions = [attnames.index(column) for column in columns]
+        quote = connection.ops.quote_name
+        self.table = quote(model._meta.db_table)
+        self.columns = ', '.join(quote(field.column) for field in fields)
+
+    def prepare(self, values):
+        row = list(self.defaults)
+        for position, value in zip(self.positions, values):
+            row[position] = value
+        return row
+
+    def write(self, rows):
+        rows = [self.prepare(values) for values in rows]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.copy_expert(
+                    f'COPY {self.table} ({self.columns}) FROM STDIN',
+                    StringIO(''.join(
+                        '\t'.join(map(copy_value, row)) + '\n'
+                        for row in rows
+                    )),
+                )
+            else:
+                params = ', '.join(['%s'] * len(self.defaults))
+                cursor.executemany(
+                    f'INSERT INTO {self.table} ({self.columns}) '
+                    f'VALUES ({params})',
+                    rows,
+                )
+
+
+def next_id(model) -> int:
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class LoadDataGenerator:
+    '''
+    Класс LoadDataGenerator.
+
+    Наполняет базу пользователями, рецептами, ингредиентами рецептов,
+    избранным, списками покупок и подписками. Популярность авторов,
+    ингредиентов и рецептов подчиняется закону Ципфа, а при одном
+    и том же seed на одной и той же базе данные совпадают.
+
+    id новых записей назначаются заранее, поэтому связи строятся
+    без повторного чтения таблиц. Записи пишутся порциями по chunk
+    через TableWriter. Сигналы при этом не срабатывают, поэтому
+    в конце счётчики пересчитываются, а версии данных для кэшей
+    увеличиваются.
+    '''
+    def __init__(self, users, recipes, seed=0, chunk=10000,
+                 favorites=10, carts=3, subscriptions=5, progress=None):
+        self.users = users
+        self.recipes = recipes
+        self.rng = random.Random(seed)
+        self.chunk = chunk
+        self.favorites = favorites
+        self.carts = carts
+        self.subscriptions = subscriptions
+        self.progress = progress or (lambda message: None)
+
+    def run(self) -> dict:
+        '''
+        Создаёт данные и возвращает число записей по моделям.
+        '''
+        ingredient_ids, tag_ids = seed_catalogue()
+        first_user = next_id(User)
+        user_ids = range(first_user, first_user + self.users)
+        first_recipe = next_id(Recipe)
+        recipe_ids = range(first_recipe, first_recipe + self.recipes)
+        authors = ZipfSampler(user_ids, self.rng)
+        popular = ZipfSampler(recipe_ids, self.rng)
+
+        written = {}
+        written[User] = self.write(
+            User, ('id', 'username', 'email', 'first_name', 'last_name',
+                   'password'),
+            self.user_rows(user_ids),
+        )
+        written[Recipe] = self.write(
+            Recipe, ('id', 'author_id', 'name', 'text', 'cooking_time',
+                     'image'),
+            self.recipe_rows(recipe_ids, authors),
+        )
+        written[RecipeTag] = self.write(
+            RecipeTag, ('recipe_id', 'tag_id'),
+            self.tag_rows(recipe_ids, tag_ids),
+        )
+        written[RecipeIngredientAmount] = self.write(
+            RecipeIngredientAmount, ('recipe_id', 'ingredient_id', 'amount'),
+            self.ingredient_rows(
+                recipe_ids, ZipfSampler(ingredient_ids, self.rng)
+            ),
+        )
+        for model, average in ((UserFavoriteRecipe, self.favorites),
+                               (UserShoppingCart, self.carts)):
+            written[model] = self.write(
+                model, ('user_id', 'recipe_id'),
+                self.choice_rows(user_ids, popular, average),
+            )
+        written[SubscribeUser] = self.write(
+            SubscribeUser, ('user_id', 'author_id'),
+            self.subscription_rows(user_ids, authors),
+        )
+        self.finish()
+        return {model._meta.label: count for model, count in written.items()}
+
+    def write(self, model, columns, rows) -> int:
+        '''
+        Записывает строки порциями и сообщает о ходе записи.
+        '''
+        writer = TableWriter(model, columns)
+        label = model._meta.label
+        started = time.monotonic()
+        written = 0
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.chunk))
+            if not batch:
+                return written
+            with transaction.atomic():
+                writer.write(batch)
+            written += len(batch)
+            elapsed = time.monotonic() - started
+            self.progress(
+                f'{label}: {written} rows, {elapsed:.1f} s, '
+                f'{written / max(elapsed, 1e-6):.0f} rows/s'
+            )
+
+    def user_rows(self, user_ids):
+        for pk in user_ids:
+            yield (
+                pk, f'load{pk}', f'load{pk}@example.com',
+                'Имя', 'Фамилия', '!',
+            )
+
+    def recipe_rows(self, recipe_ids, authors):
+        for pk in recipe_ids:
+            yield (
+                pk, authors.one(),
+                f'{self.rng.choice(BENCHMARK_WORDS)} по-домашнему {pk}',
+                'Нарезать, смешать и готовить до готовности.',
+                self.rng.randint(5, 120), 'recipes/benchmark.png',
+            )
+
+    def tag_rows(self, recipe_ids, tag_ids):
+        for recipe_id in recipe_ids:
+            for tag_id in self.rng.sample(
+                tag_ids, self.rng.randint(1, len(tag_ids))
+            ):
+                yield recipe_id, tag_id
+
+    def ingredient_rows(self, recipe_ids, ingredients):
+        for recipe_id in recipe_ids:
+            for ingredient_id in sorted(
+                ingredients.distinct(self.rng.randint(3, 10))
+            ):
+                yield recipe_id, ingredient_id, self.rng.randint(1, 500)
+
+    def choice_rows(self, user_ids, popular, average):
+        for user_id in user_ids:
+            for recipe_id in sorted(
+                popular.distinct(self.rng.randint(0, 2 * average))
+            ):
+                yield user_id, recipe_id
+
+    def subscription_rows(self, user_ids, authors):
+        for user_id in user_ids:
+            for author_id in sorted(authors.distinct(
+                self.rng.randint(0, 2 * self.subscriptions)
+            )):
+                if author_id != user_id:
+                    yield user_id, author_id
+
+    def finish(self):
+        '''
+        Сдвигает последовательности id за вставленные записи,
+        пересчитывает счётчики и увеличивает версии данных.
+        '''
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), LOAD_MODELS
+            ):
+                cursor.execute(sql)
+        for counter in RECIPES_COUNTERS + USERS_COUNTERS:
+            with transaction.atomic():
+                counter.recompute()
+            self.progress(f'{counter}: recomputed')
+        bump_versions(*LOAD_MODELS)
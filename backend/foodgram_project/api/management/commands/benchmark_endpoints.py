@@ -0,0 +1,74 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from api.benchmark import benchmark_meta, benchmark_scale, compare_reports
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеры API на синтетических данных разного масштаба '
+        'во временной тестовой базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', type=int, nargs='+', default=[1000, 10000, 100000]
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--baseline')
+        parser.add_argument('--tolerance', type=float, default=1.25)
+
+    def handle(self, *args, **kwargs):
+        '''
+        Основная функция выполнения команды.
+        '''
+        report = {'meta': None, 'scales': {}}
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            report['meta'] = benchmark_meta()
+            for scale in kwargs['scales']:
+                call_command('flush', interactive=False, verbosity=0)
+                self.stdout.write(f'{scale} recipes...')
+                report['scales'][str(scale)] = benchmark_scale(
+                    scale, kwargs['repeat'], kwargs['seed']
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(kwargs['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        for scale, endpoints in report['scales'].items():
+            for name, result in endpoints.items():
+                self.stdout.write(
+                    f'{scale:>7} {name:<32} '
+                    f'cold p50 {result["cold_p50_ms"]:>9} ms  '
+                    f'warm p50 {result["warm_p50_ms"]:>9} ms  '
+                    f'warm p99 {result["warm_p99_ms"]:>9} ms  '
+                    f'queries {result["queries"]:>3}/'
+                    f'{result["warm_queries"]:<3}  '
+                    f'peak {result["peak_kb"]:>8} KiB'
+                )
+        self.stdout.write(f'Report written to {kwargs["output"]}')
+
+        if kwargs['baseline']:
+            with open(kwargs['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions = compare_reports(
+                report, baseline, kwargs['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    'Regressions against baseline:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write('No regressions against baseline')
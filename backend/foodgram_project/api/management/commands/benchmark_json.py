@@ -0,0 +1,107 @@
+import timeit
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from api.renderers import FastJSONRenderer, orjson
+
+
+def recipe_page(size):
+    '''
+    Страница рецептов в том виде, в каком её отдаёт ResipeSerializer.
+    '''
+    results = ReturnList(serializer=None)
+    for number in range(size):
+        results.append(OrderedDict((
+            ('id', number),
+            ('tags', [
+                OrderedDict((
+                    ('id', tag), ('name', f'Тег {tag}'),
+                    ('color', '#E26C2D'), ('slug', f'tag_{tag}'),
+                ))
+                for tag in range(3)
+            ]),
+            ('author', OrderedDict((
+                ('email', f'user{number}@example.com'),
+                ('id', number % 50),
+                ('username', f'user{number}'),
+                ('first_name', 'Иван'),
+                ('last_name', 'Петров'),
+                ('is_subscribed', bool(number % 2)),
+            ))),
+            ('ingredients', [
+                OrderedDict((
+                    ('id', ingredient), ('name', 'абрикосовое варенье'),
+                    ('measurement_unit', 'г'), ('amount', 100 + ingredient),
+                ))
+                for ingredient in range(8)
+            ]),
+            ('is_favorited', False),
+            ('is_in_shopping_cart', True),
+            ('name', f'Рецепт номер {number}'),
+            ('image', f'http://localhost/media/recipes/{number}.png'),
+            ('text', 'Нарезать, смешать и запекать 40 минут. ' * 10),
+            ('cooking_time', 40),
+        )))
+    return ReturnDict((
+        ('count', size * 10),
+        ('next', 'http://localhost/api/recipes/?page=2'),
+        ('previous', None),
+        ('results', results),
+    ), serializer=None)
+
+
+def ingredient_list(size):
+    '''
+    Список ингредиентов без пагинации, как /api/ingredients/.
+    '''
+    return ReturnList((
+        OrderedDict((
+            ('id', number),
+            ('name', f'абрикосовое варенье {number}'),
+            ('measurement_unit', 'г'),
+        ))
+        for number in range(size)
+    ), serializer=None)
+
+
+class Command(BaseCommand):
+    help = 'Сравнение скорости JSONRenderer и FastJSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **kwargs):
+        '''
+        Основная функция выполнения команды.
+        '''
+        backend = 'orjson' if orjson is not None else 'json (fallback)'
+        self.stdout.write(f'FastJSONRenderer backend: {backend}')
+        payloads = (
+            (f'recipes page x{kwargs["recipes"]}',
+             recipe_page(kwargs['recipes'])),
+            (f'ingredients x{kwargs["ingredients"]}',
+             ingredient_list(kwargs['ingredients'])),
+        )
+        renderers = (JSONRenderer(), FastJSONRenderer())
+        for name, payload in payloads:
+            rendered = [renderer.render(payload) for renderer in renderers]
+            if rendered[0] != rendered[1]:
+                self.stderr.write(f'{name}: rendered bytes differ')
+            timings = [
+                min(timeit.repeat(
+                    lambda: renderer.render(payload),
+                    number=kwargs['repeat'], repeat=3,
+                )) / kwargs['repeat'] * 1000
+                for renderer in renderers
+            ]
+            self.stdout.write(
+                f'{name} ({len(rendered[0])} bytes): '
+                f'JSONRenderer {timings[0]:.3f} ms, '
+                f'FastJSONRenderer {timings[1]:.3f} ms, '
+                f'x{timings[0] / timings[1]:.1f}'
+            )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.loaddata import LoadDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация пользователей, рецептов, избранного, списков покупок '
+        'и подписок для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=10)
+        parser.add_argument('--carts', type=int, default=3)
+        parser.add_argument('--subscriptions', type=int, default=5)
+
+    def handle(self, *args, **kwargs):
+        '''
+        Основная функция выполнения команды.
+        '''
+        generator = LoadDataGenerator(
+            kwargs['users'], kwargs['recipes'], seed=kwargs['seed'],
+            chunk=kwargs['chunk'], favorites=kwargs['favorites'],
+            carts=kwargs['carts'], subscriptions=kwargs['subscriptions'],
+            progress=self.stdout.write,
+        )
+        for label, count in generator.run().items():
+            self.stdout.write(f'ADD {count} {label}')
@@ -0,0 +1,23 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from api.images import process_recipe_image
+from recipes.models import IMAGE_PENDING, Recipe
+
+
+class Command(BaseCommand):
+    help = 'Обработка загруженных картинок рецептов, ждущих обработки'
+
+    def handle(self, *args, **kwargs):
+        '''
+        Основная функция выполнения команды.
+        '''
+        states = Counter()
+        pending = Recipe.objects.filter(
+            image_state=IMAGE_PENDING
+        ).values_list('pk', flat=True)
+        for recipe_id in pending.iterator():
+            states[process_recipe_image(recipe_id)] += 1
+        for state, count in states.items():
+            self.stdout.write(f'{state or "skipped"}: {count}')
@@ -0,0 +1,311 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from glob import glob
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from foodgram_project.settings import PROJECT_SETTINGS
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+HTTP_METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+_local = threading.local()
+
+
+def record_cache(name, hits, misses=0):
+    '''
+    Учитывает попадания и промахи кэша name в текущем запросе.
+    '''
+    collector = getattr(_local, 'collector', None)
+    if collector is not None:
+        collector.cache[name, 'hit'] += hits
+        collector.cache[name, 'miss'] += misses
+
+
+def view_label(view_func, method) -> str:
+    '''
+    Имя представления для метрик: ViewSet.action для вьюсетов
+    DRF, ViewName.method для остальных.
+    '''
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+def merge(target, source):
+    '''
+    Складывает снимок source в target: числа суммируются,
+    списки поэлементно, словари рекурсивно.
+    '''
+    for key, value in source.items():
+        if isinstance(value, dict):
+            merge(target.setdefault(key, {}), value)
+        elif isinstance(value, list):
+            current = target.setdefault(key, [0] * len(value))
+            target[key] = [a + b for a, b in zip(current, value)]
+        else:
+            target[key] = target.get(key, 0) + value
+    return target
+
+
+class RequestCollector:
+    '''
+    Класс RequestCollector считает запросы к базе и обращения
+    к кэшам в пределах одного запроса.
+    '''
+    def __init__(self):
+        self.queries = 0
+        self.cache = Counter()
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsRegistry:
+    '''
+    Класс MetricsRegistry.
+
+    Копит в памяти процесса число запросов по представлению,
+    методу и статусу, гистограммы времени ответа, число запросов
+    к базе и обращения к кэшам. Если задан каталог directory,
+    каждый процесс (воркер gunicorn) не чаще раза в flush_interval
+    секунд записывает туда свой снимок, а collect складывает
+    снимки всех процессов. Снимки, не обновлявшиеся stale_after
+    секунд, удаляются.
+    '''
+    def __init__(self, directory=None, flush_interval=5.0,
+                 stale_after=86400):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.flushed = 0.0
+        self.data = {'requests': {}, 'latency': {}, 'queries': {}, 'cache': {}}
+
+    @property
+    def filename(self) -> str:
+        return os.path.join(
+            self.directory, f'{self.pid}-{int(self.started * 1000)}.json'
+        )
+
+    def observe(self, view, method, status, duration, collector):
+        if method not in HTTP_METHODS:
+            method = 'other'
+        bucket = next(
+            (index for index, bound in enumerate(LATENCY_BUCKETS)
+             if duration <= bound),
+            len(LATENCY_BUCKETS),
+        )
+        with self.lock:
+            if os.getpid() != self.pid:
+                # Процесс создан fork и унаследовал данные родителя.
+                self.reset()
+            requests = self.data['requests'].setdefault(view, {})
+            statuses = requests.setdefault(method, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            latency = self.data['latency'].setdefault(view, {
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                'sum': 0.0, 'count': 0,
+            })
+            latency['buckets'][bucket] += 1
+            latency['sum'] += duration
+            latency['count'] += 1
+            queries = self.data['queries']
+            queries[view] = queries.get(view, 0) + collector.queries
+            if collector.cache:
+                caches = self.data['cache'].setdefault(view, {})
+                for (name, result), count in collector.cache.items():
+                    results = caches.setdefault(name, {})
+                    results[result] = results.get(result, 0) + count
+        self.flush()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return json.loads(json.dumps(self.data))
+
+    def flush(self, force=False):
+        '''
+        Записывает снимок процесса в каталог, если пора. У каждой
+        записи свой временный файл, поэтому потоки не мешают друг
+        другу; ошибка записи только попадает в лог.
+        '''
+        if not self.directory:
+            return
+        now = time.time()
+        if not force and now - self.flushed < self.flush_interval:
+            return
+        self.flushed = now
+        filename = self.filename
+        temporary = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=self.directory,
+                prefix=f'{self.pid}-', suffix='.tmp', delete=False,
+            ) as f:
+                temporary = f.name
+                json.dump(self.snapshot(), f)
+            os.replace(temporary, filename)
+        except OSError:
+            logger.exception('Metrics flush to %s failed', filename)
+            if temporary is not None and os.path.exists(temporary):
+                os.remove(temporary)
+
+    def collect(self) -> dict:
+        '''
+        Возвращает сумму снимков всех процессов.
+        '''
+        if not self.directory:
+            return self.snapshot()
+        self.flush(force=True)
+        total = {}
+        stale = time.time() - self.stale_after
+        for filename in glob(os.path.join(self.directory, '*.json')):
+            try:
+                if os.path.getmtime(filename) < stale:
+                    os.remove(filename)
+                    continue
+                with open(filename, encoding='utf-8') as f:
+                    merge(total, json.load(f))
+            except (OSError, ValueError):
+                continue
+        return total
+
+    def render(self) -> str:
+        return render_metrics(self.collect())
+
+
+def labels(**values) -> str:
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"'),
+        )
+        for name, value in values.items()
+    )
+    return '{' + pairs + '}'
+
+
+def render_metrics(data) -> str:
+    '''
+    Снимок метрик в текстовом формате Prometheus.
+    '''
+    lines = [
+        '# HELP foodgram_requests_total Requests by view, method and status.',
+        '# TYPE foodgram_requests_total counter',
+    ]
+    for view, methods in sorted(data.get('requests', {}).items()):
+        for method, statuses in sorted(methods.items()):
+            for status, count in sorted(statuses.items()):
+                lines.append('foodgram_requests_total' + labels(
+                    view=view, method=method, status=status
+                ) + f' {count}')
+
+    lines.extend((
+        '# HELP foodgram_request_duration_seconds Response time by view.',
+        '# TYPE foodgram_request_duration_seconds histogram',
+    ))
+    for view, latency in sorted(data.get('latency', {}).items()):
+        cumulative = 0
+        bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+        for bound, count in zip(bounds, latency['buckets']):
+            cumulative += count
+            lines.append('foodgram_request_duration_seconds_bucket' + labels(
+                view=view, le=bound
+            ) + f' {cumulative}')
+        lines.append(
+            'foodgram_request_duration_seconds_sum' + labels(view=view)
+            + f' {latency["sum"]:.6f}'
+        )
+        lines.append(
+            'foodgram_request_duration_seconds_count' + labels(view=view)
+            + f' {latency["count"]}'
+        )
+
+    lines.extend((
+        '# HELP foodgram_db_queries_total Database queries by view.',
+        '# TYPE foodgram_db_queries_total counter',
+    ))
+    for view, count in sorted(data.get('queries', {}).items()):
+        lines.append(
+            'foodgram_db_queries_total' + labels(view=view) + f' {count}'
+        )
+
+    lines.extend((
+        '# HELP foodgram_cache_requests_total Cache lookups by view, '
+        'cache and result.',
+        '# TYPE foodgram_cache_requests_total counter',
+    ))
+    for view, caches in sorted(data.get('cache', {}).items()):
+        for name, results in sorted(caches.items()):
+            for result, count in sorted(results.items()):
+                lines.append('foodgram_cache_requests_total' + labels(
+                    view=view, cache=name, result=result
+                ) + f' {count}')
+    return '\n'.join(lines) + '\n'
+
+
+metrics_registry = MetricsRegistry(
+    PROJECT_SETTINGS.get('metrics_dir'),
+    PROJECT_SETTINGS.get('metrics_flush_interval'),
+)
+
+
+def metrics_text() -> str:
+    return metrics_registry.render()
+
+
+class MetricsMiddleware:
+    '''
+    Класс MetricsMiddleware.
+
+    Учитывает каждый запрос в metrics_registry под именем
+    обработавшего его представления.
+    '''
+    def __init__(self, get_response):
+        if not PROJECT_SETTINGS.get('metrics'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = RequestCollector()
+        _local.collector = collector
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(collector.count_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.collector = None
+        metrics_registry.observe(
+            getattr(request, 'metrics_view', 'unmatched'),
+            request.method, response.status_code,
+            time.perf_counter() - started, collector,
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_label(view_func, request.method)
@@ -1,8 +1,194 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.counting import CountingPaginator
+
+
+class KeysetCursorPaginator(BasePagination):
+    '''
+    Класс KeysetCursorPaginator.
+
+    Постраничный вывод по курсору: вместо OFFSET и COUNT(*) следующая
+    страница ищется условием по ключу сортировки последней записи,
+    что позволяет базе сразу перейти к нужному месту индекса.
+    Порядок задаётся атрибутом cursor_ordering представления,
+    последним полем в нём должен быть уникальный ключ.
+    '''
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = None
+    ordering = ('pk',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.ordering = tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+        position, reverse = self.decode_cursor(request, queryset.model)
+        if reverse:
+            queryset = queryset.order_by(
+                *(f'-{field}' for field in self.ordering)
+            )
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position, reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        try:
+            page_size = int(value)
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        if self.max_page_size:
+            return min(page_size, self.max_page_size)
+        return page_size
+
+    def get_seek_filter(self, position, reverse):
+        '''
+        Условие «строго после позиции» для составного ключа сортировки.
+        Дополнительное условие по первому полю даёт базе границу
+        для поиска по индексу.
+        '''
+        lookup = 'lt' if reverse else 'gt'
+        bound = 'lte' if reverse else 'gte'
+        seek = Q()
+        for index, field in enumerate(self.ordering):
+            step = Q(**{f'{field}__{lookup}': position[index]})
+            for prev_field, prev_value in zip(self.ordering, position):
+                if prev_field == field:
+                    break
+                step &= Q(**{prev_field: prev_value})
+            seek |= step
+        return Q(**{f'{self.ordering[0]}__{bound}': position[0]}) & seek
+
+    def decode_cursor(self, request, model):
+        '''
+        Позиция и направление из курсора. Значения позиции приводятся
+        к типам полей сортировки, поэтому подделанный курсор даёт 404,
+        а не ошибку в фильтре.
+        '''
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            data = json.loads(
+                urlsafe_b64decode(encoded + padding).decode('utf-8')
+            )
+            position = data['p']
+            reverse = bool(data.get('r'))
+            if (not isinstance(position, list)
+                    or len(position) != len(self.ordering)):
+                raise ValueError(position)
+            position = [
+                self.ordering_field(model, field).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+            if None in position:
+                raise ValueError(position)
+        except (TypeError, ValueError, KeyError, binascii.Error,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    @staticmethod
+    def ordering_field(model, name):
+        if name == 'pk':
+            return model._meta.pk
+        return model._meta.get_field(name)
+
+    def encode_cursor(self, instance, reverse):
+        position = [
+            instance.serializable_value(field) for field in self.ordering
+        ]
+        data = {'p': position}
+        if reverse:
+            data['r'] = 1
+        raw = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+        encoded = urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(
+            url, self.cursor_query_param, encoded.rstrip('=')
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
 
 
 class PageNumberCustomPaginator(PageNumberPagination):
     '''
     Класс PageNumberCustomPaginator.
+
+    Если в запросе передан параметр cursor (в том числе пустой),
+    страница строится KeysetCursorPaginator. Иначе число объектов
+    берётся из CountingPaginator, а заголовок X-Count-Exact
+    сообщает, точное оно или оценочное.
     '''
     page_size_query_param = 'limit'
+    django_paginator_class = CountingPaginator
+    count_exact_header = 'X-Count-Exact'
+    cursor_paginator_class = KeysetCursorPaginator
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        cursor_param = self.cursor_paginator_class.cursor_query_param
+        if cursor_param in request.query_params:
+            self.cursor_paginator = self.cursor_paginator_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        response = super().get_paginated_response(data)
+        exact = self.page.paginator.count_is_exact
+        response[self.count_exact_header] = 'true' if exact else 'false'
+        return response
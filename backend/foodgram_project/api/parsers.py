@@ -0,0 +1,29 @@
+import codecs
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from api.renderers import FastJSONRenderer, orjson
+
+
+class FastJSONParser(JSONParser):
+    '''
+    Класс FastJSONParser.
+
+    Разбирает тело запроса в UTF-8 через orjson, если он установлен.
+    Всё, что orjson не принял, повторно разбирается JSONParser,
+    поэтому результат и сообщения об ошибках не меняются.
+    '''
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        raw = stream.read()
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return super().parse(BytesIO(raw), media_type, parser_context)
@@ -1,6 +1,10 @@
+from ipaddress import ip_address, ip_network
+
 from django.contrib.auth import get_user_model
 from rest_framework import permissions
 
+from foodgram_project.settings import PROJECT_SETTINGS
+
 User = get_user_model()
 
 
@@ -12,3 +16,25 @@ class AuthorOrReadOnly(permissions.IsAuthenticatedOrReadOnly):
             request.method == 'GET'
             or user == obj.author
         )
+
+
+class InternalCallerOnly(permissions.BasePermission):
+    '''
+    Класс InternalCallerOnly.
+
+    Пропускает запросы из сетей metrics_allowed_networks, пришедшие
+    напрямую: запрос через прокси (с X-Forwarded-For или X-Real-IP)
+    считается внешним, даже если прокси во внутренней сети.
+    '''
+    def has_permission(self, request, view):
+        meta = request.META
+        if 'HTTP_X_FORWARDED_FOR' in meta or 'HTTP_X_REAL_IP' in meta:
+            return False
+        try:
+            address = ip_address(meta.get('REMOTE_ADDR', ''))
+        except ValueError:
+            return False
+        return any(
+            address in ip_network(network)
+            for network in PROJECT_SETTINGS.get('metrics_allowed_networks')
+        )
@@ -0,0 +1,132 @@
+import gzip
+from threading import Lock
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from api.metrics import record_cache
+from api.renderers import FastJSONRenderer
+from api.versions import get_versions
+from foodgram_project.settings import PROJECT_SETTINGS
+
+
+def parse_quality(params) -> float:
+    '''
+    Значение q из параметров кодирования в Accept-Encoding.
+    '''
+    for param in params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_gzip(accept_encoding) -> bool:
+    '''
+    Разрешает ли заголовок Accept-Encoding ответ в gzip: кодирование
+    gzip или * с q больше нуля (gzip;q=0 - запрет).
+    '''
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        qualities[coding.strip().lower()] = parse_quality(params)
+    quality = qualities.get('gzip', qualities.get('*', 0.0))
+    return quality > 0
+
+
+class PrerenderedBody:
+    '''
+    Класс PrerenderedBody.
+
+    Тело ответа в JSON и его gzip-версия, которые хранятся в памяти
+    процесса вместе с версией данных, из которых они собраны.
+    '''
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self._data = (None, b'', b'')
+
+    def get(self, version, load):
+        '''
+        Возвращает пару (тело, сжатое тело) для версии version,
+        при необходимости пересобирая её из данных load().
+        Если load() вернул None, возвращает None.
+        '''
+        data = self._data
+        if data[0] == version:
+            record_cache('prerendered', 1)
+            return data[1:]
+        record_cache('prerendered', 0, 1)
+        with self._lock:
+            if self._data[0] != version:
+                content = load()
+                if content is None:
+                    return None
+                body = FastJSONRenderer().render(content)
+                self._data = (version, body, gzip.compress(body))
+            return self._data[1:]
+
+
+class PrerenderedListMixin:
+    '''
+    Класс PrerenderedListMixin для list.
+
+    Запрос списка без параметров получает заранее отрендеренный
+    справочник целиком, сжатый gzip, если клиент это поддерживает.
+    Тело пересобирается только при изменении моделей
+    conditional_models. Сжатый ответ получает свой ETag
+    (ConditionalGetMixin.get_conditional_encoding).
+    '''
+    prerendered_body = None
+
+    def get_prerendered_data(self):
+        return self.get_serializer(self.get_queryset(), many=True).data
+
+    def prerendered_enabled(self, request) -> bool:
+        return (
+            PROJECT_SETTINGS.get('catalogue_prerender')
+            and not request.query_params
+            and isinstance(request.accepted_renderer, JSONRenderer)
+        )
+
+    def prerendered_gzip(self, request) -> bool:
+        return accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+
+    def get_conditional_encoding(self, request):
+        if self.action == 'list' and self.prerendered_enabled(request):
+            return 'gzip' if self.prerendered_gzip(request) else None
+        return super().get_conditional_encoding(request)
+
+    def get_prerendered_response(self, request):
+        if not self.prerendered_enabled(request):
+            return None
+        renderer = request.accepted_renderer
+        bodies = self.prerendered_body.get(
+            get_versions(*self.conditional_models),
+            self.get_prerendered_data,
+        )
+        if bodies is None:
+            return None
+        body, compressed = bodies
+        if self.prerendered_gzip(request):
+            response = HttpResponse(
+                compressed, content_type=renderer.media_type
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type=renderer.media_type)
+        response['Content-Length'] = len(response.content)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        response = self.get_prerendered_response(request)
+        if response is None:
+            return super().list(request, *args, **kwargs)
+        return response
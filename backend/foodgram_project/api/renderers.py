@@ -0,0 +1,56 @@
+from rest_framework.renderers import JSONRenderer
+
+from api.timing import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = 0 if orjson is None else (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+)
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    '''
+    Класс FastJSONRenderer.
+
+    Рендерит компактный JSON через orjson, если он установлен.
+    Типы, которые orjson не знает, а также даты и время передаются
+    кодировщику DRF, поэтому результат совпадает с JSONRenderer.
+    Запросы с отступами, ensure_ascii и ошибки orjson обслуживает
+    стандартный JSONRenderer. Отличаются только значения float:
+    NaN и Infinity orjson выводит как null, а не отклоняет,
+    но сериализаторы проекта float не отдают.
+    '''
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return self.render_json(
+                data, accepted_media_type, renderer_context
+            )
+
+    def render_json(self, data, accepted_media_type, renderer_context):
+        if (orjson is None or data is None
+                or self.ensure_ascii or not self.compact
+                or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=ORJSON_OPTIONS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        return ret.replace(LINE_SEPARATOR, b'\\u2028').replace(
+            PARAGRAPH_SEPARATOR, b'\\u2029'
+        )
@@ -0,0 +1,137 @@
+from recipes.models import UserFavoriteRecipe, UserShoppingCart
+from users.models import SubscribeUser
+
+
+class ViewerStateResolver:
+    '''
+    Класс ViewerStateResolver.
+
+    Отвечает на вопросы «рецепт в избранном», «рецепт в списке покупок»
+    и «есть подписка на автора» для пользователя текущего запроса.
+    Идентификаторы рецептов и авторов копятся заранее, а затем
+    проверяются одним IN-запросом на каждую таблицу.
+    '''
+    context_key = 'viewer_state'
+
+    def __init__(self, user=None):
+        if user is not None and not user.is_authenticated:
+            user = None
+        self.user = user
+        self._pending_recipe_ids = set()
+        self._loaded_recipe_ids = set()
+        self._favorite_ids = set()
+        self._cart_ids = set()
+        self._pending_author_ids = set()
+        self._loaded_author_ids = set()
+        self._subscribed_ids = set()
+
+    @classmethod
+    def from_context(cls, context):
+        '''
+        Возвращает резолвер из контекста сериализатора,
+        при необходимости создавая его.
+        '''
+        resolver = context.get(cls.context_key)
+        if resolver is None:
+            request = context.get('request')
+            resolver = cls(getattr(request, 'user', None))
+            context[cls.context_key] = resolver
+        return resolver
+
+    def add_recipes(self, recipes):
+        '''
+        Запоминает рецепты и их авторов для последующей проверки.
+        Флаги, уже посчитанные аннотациями queryset, сохраняются сразу.
+        '''
+        if self.user is None:
+            return
+        for recipe in recipes:
+            favorited = getattr(recipe, 'is_favorited_flag', None)
+            in_cart = getattr(recipe, 'is_in_shopping_cart_flag', None)
+            if favorited is not None and in_cart is not None:
+                self._store_recipe(recipe.pk, favorited, in_cart)
+            elif recipe.pk not in self._loaded_recipe_ids:
+                self._pending_recipe_ids.add(recipe.pk)
+
+            subscribed = getattr(recipe, 'author_is_subscribed_flag', None)
+            if subscribed is not None:
+                self._store_author(recipe.author_id, subscribed)
+            elif recipe.author_id not in self._loaded_author_ids:
+                self._pending_author_ids.add(recipe.author_id)
+
+    def add_authors(self, authors):
+        '''
+        Запоминает авторов для последующей проверки подписок.
+        '''
+        if self.user is None:
+            return
+        for author in authors:
+            if author.pk not in self._loaded_author_ids:
+                self._pending_author_ids.add(author.pk)
+
+    def is_favorited(self, recipe):
+        if self.user is None:
+            return False
+        self._ensure_recipe(recipe.pk)
+        return recipe.pk in self._favorite_ids
+
+    def is_in_shopping_cart(self, recipe):
+        if self.user is None:
+            return False
+        self._ensure_recipe(recipe.pk)
+        return recipe.pk in self._cart_ids
+
+    def is_subscribed(self, author):
+        return self._is_subscribed_id(author.pk)
+
+    def author_is_subscribed(self, recipe):
+        return self._is_subscribed_id(recipe.author_id)
+
+    def _is_subscribed_id(self, author_id):
+        if self.user is None:
+            return False
+        self._ensure_author(author_id)
+        return author_id in self._subscribed_ids
+
+    def _store_recipe(self, recipe_id, favorited, in_cart):
+        self._loaded_recipe_ids.add(recipe_id)
+        self._pending_recipe_ids.discard(recipe_id)
+        if favorited:
+            self._favorite_ids.add(recipe_id)
+        if in_cart:
+            self._cart_ids.add(recipe_id)
+
+    def _store_author(self, author_id, subscribed):
+        self._loaded_author_ids.add(author_id)
+        self._pending_author_ids.discard(author_id)
+        if subscribed:
+            self._subscribed_ids.add(author_id)
+
+    def _ensure_recipe(self, recipe_id):
+        if recipe_id in self._loaded_recipe_ids:
+            return
+        ids = self._pending_recipe_ids | {recipe_id}
+        self._favorite_ids.update(
+            UserFavoriteRecipe.objects.filter(
+                user=self.user, recipe_id__in=ids
+            ).values_list('recipe_id', flat=True)
+        )
+        self._cart_ids.update(
+            UserShoppingCart.objects.filter(
+                user=self.user, recipe_id__in=ids
+            ).values_list('recipe_id', flat=True)
+        )
+        self._loaded_recipe_ids.update(ids)
+        self._pending_recipe_ids.clear()
+
+    def _ensure_author(self, author_id):
+        if author_id in self._loaded_author_ids:
+            return
+        ids = self._pending_author_ids | {author_id}
+        self._subscribed_ids.update(
+            SubscribeUser.objects.filter(
+                user=self.user, author_id__in=ids
+            ).values_list('author_id', flat=True)
+        )
+        self._loaded_author_ids.update(ids)
+        self._pending_author_ids.clear()
@@ -0,0 +1,131 @@
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from foodgram_project.settings import PROJECT_SETTINGS
+
+SEARCH_CONFIG = 'russian'
+TRIGRAM_THRESHOLD = 0.3
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def fuzzy_limit() -> int:
+    return PROJECT_SETTINGS.get('ingredient_fuzzy_limit')
+
+
+def search_recipes(queryset, value):
+    '''
+    Полнотекстовый поиск рецептов по названию и описанию,
+    результаты упорядочены по релевантности.
+    '''
+    value = value.strip()
+    if not value:
+        return queryset
+    if connections[queryset.db].vendor == 'postgresql':
+        return search_recipes_postgresql(queryset, value)
+    return search_recipes_fallback(queryset, value)
+
+
+def search_recipes_postgresql(queryset, value):
+    '''
+    Поиск по вектору search_vector, который поддерживается триггером
+    и проиндексирован GIN-индексом.
+    '''
+    query = SearchQuery(value, config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query)
+    ).order_by('-search_rank', 'name', 'id')
+
+
+def search_recipes_fallback(queryset, value):
+    '''
+    Поиск для баз без полнотекстового поиска: каждое слово должно
+    встретиться в названии или описании, совпадения в названии
+    поднимают рецепт выше.
+    '''
+    rank = Value(0, output_field=IntegerField())
+    for term in value.split():
+        queryset = queryset.filter(
+            Q(name__icontains=term) | Q(text__icontains=term)
+        )
+        rank = rank + Case(
+            When(name__icontains=term, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+    return queryset.annotate(search_rank=rank).order_by(
+        '-search_rank', 'name', 'id'
+    )
+
+
+def prefix_match(value):
+    '''
+    Выражение для сортировки: 0 для названий, начинающихся с value.
+    '''
+    return Case(
+        When(name__istartswith=value, then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+
+
+def search_ingredients(queryset, value):
+    '''
+    Ингредиенты, название которых начинается с value,
+    а за ними те, где value встречается внутри названия.
+    '''
+    return queryset.filter(name__icontains=value).annotate(
+        prefix_match=prefix_match(value)
+    ).order_by('prefix_match', 'name', 'id')
+
+
+def trigrams(value) -> set:
+    '''
+    Триграммы строки по правилам pg_trgm: каждое слово в нижнем
+    регистре дополняется двумя пробелами слева и одним справа.
+    '''
+    grams = set()
+    for word in WORD_RE.findall(value.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def trigram_similarity(first, second) -> float:
+    first, second = trigrams(first), trigrams(second)
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def fuzzy_ingredients(queryset, value):
+    '''
+    Нечёткий поиск ингредиентов по сходству триграмм. В PostgreSQL
+    используется оператор % и GIN-индекс pg_trgm, в остальных базах
+    сходство считается в Python.
+    '''
+    if connections[queryset.db].vendor == 'postgresql':
+        return queryset.filter(name__trigram_similar=value).annotate(
+            similarity=TrigramSimilarity('name', value),
+            prefix_match=prefix_match(value),
+        ).order_by('prefix_match', '-similarity', 'name', 'id')[
+            :fuzzy_limit()
+        ]
+    needle = value.lower()
+    ranked = []
+    for pk, name in queryset.values_list('id', 'name'):
+        score = trigram_similarity(value, name)
+        if score > TRIGRAM_THRESHOLD:
+            prefix = name.lower().startswith(needle)
+            ranked.append((not prefix, -score, name.lower(), pk))
+    ids = [pk for *_, pk in sorted(ranked)[:fuzzy_limit()]]
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)),
+        output_field=IntegerField(),
+    ))
@@ -1,20 +1,68 @@
+import binascii
+from base64 import b64decode
 from re import match
+from uuid import uuid4
 
 from django.contrib.auth import get_user_model, password_validation
 from django.core import exceptions
-from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
+from django.core.files.base import ContentFile
+from django.db import models, transaction
 from rest_framework import serializers
 
+from api.catalogue import tag_registry
+from api.images import (delete_files, image_pipeline, inspect_image,
+                        saved_upload)
+from api.resolvers import ViewerStateResolver
+from api.timing import timed
 from foodgram_project.settings import PROJECT_SETTINGS
 from ingredients.models import Ingredient, MeasurementUnit
-from recipes.models import (Recipe, RecipeIngredientAmount, RecipeTag,
-                            UserFavoriteRecipe, UserShoppingCart)
+from recipes.models import (IMAGE_PENDING, Recipe, RecipeIngredientAmount,
+                            RecipeTag)
+from recipes.signals import bulk_changed
 from tags.models import Tag
-from users.models import SubscribeUser
 
 User = get_user_model()
 
+DOES_NOT_EXIST = serializers.SlugRelatedField.default_error_messages[
+    'does_not_exist'
+]
+
+
+class ViewerStateListSerializer(serializers.ListSerializer):
+    '''
+    Класс ViewerStateListSerializer.
+
+    Перед сериализацией передаёт все объекты страницы в резолвер,
+    чтобы флаги пользователя проверялись пачкой.
+    '''
+    def to_representation(self, data):
+        with timed('serialize'):
+            items = list(self.get_iterable(data))
+            self.child.prime_viewer_state(items)
+            return [self.child.to_representation(item) for item in items]
+
+    def get_iterable(self, data):
+        if isinstance(data, models.Manager):
+            return data.all()
+        return data
+
+
+class ViewerStateMixin:
+    '''
+    Класс ViewerStateMixin даёт сериализатору доступ к резолверу
+    флагов пользователя из контекста.
+    '''
+    @property
+    def viewer_state(self) -> ViewerStateResolver:
+        return ViewerStateResolver.from_context(self.context)
+
+    def prime_viewer_state(self, instances):
+        pass
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     '''
@@ -125,7 +173,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
         )
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ViewerStateMixin, serializers.ModelSerializer):
     '''
     Класс UserSerializer для модели User.
     '''
@@ -140,17 +188,13 @@ class UserSerializer(serializers.ModelSerializer):
             'first_name', 'last_name',
             'is_subscribed',
         )
+        list_serializer_class = ViewerStateListSerializer
+
+    def prime_viewer_state(self, instances):
+        self.viewer_state.add_authors(instances)
 
     def get_is_subscribed(self, user_obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            user: User = request.user
-            return (
-                SubscribeUser.objects
-                .filter(user=user, author=user_obj)
-                .exists()
-            )
-        return False
+        return self.viewer_state.is_subscribed(user_obj)
 
 
 class UserChangePasswordSerializer(serializers.Serializer):
@@ -176,7 +220,24 @@ class UserChangePasswordSerializer(serializers.Serializer):
         return value
 
 
-class ResipeSerializer(serializers.ModelSerializer):
+class PendingImageMixin:
+    '''
+    Класс PendingImageMixin.
+
+    Пока загруженная картинка ждёт обработки и прежней картинки
+    у рецепта нет, в поле image отдаётся исходный файл.
+    '''
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if data.get('image') is None and instance.image_raw:
+            data['image'] = self.fields['image'].to_representation(
+                instance.image_raw
+            )
+        return data
+
+
+class ResipeSerializer(PendingImageMixin, ViewerStateMixin,
+                       serializers.ModelSerializer):
     '''
     Класс ResipeSerializer для модели Recipe.
     '''
@@ -204,39 +265,31 @@ class ResipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_state',
             'text',
             'cooking_time',
         )
+        list_serializer_class = ViewerStateListSerializer
+
+    def prime_viewer_state(self, instances):
+        self.viewer_state.add_recipes(instances)
+
+    def to_representation(self, instance):
+        self.viewer_state.add_recipes((instance,))
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if not request:
-            return False
-        user = request.user
-        return (user and user.is_authenticated
-                and UserFavoriteRecipe.objects.filter(
-                    user=user, recipe=obj
-                ).exists())
+        return self.viewer_state.is_favorited(obj)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if not request:
-            return False
-        user = request.user
-        return (user and user.is_authenticated
-                and UserShoppingCart.objects.filter(
-                    user=user, recipe=obj
-                ).exists())
+        return self.viewer_state.is_in_shopping_cart(obj)
 
 
 class AmountSerialazer(serializers.Serializer):
     '''
     Класс AmountSerialazer.
     '''
-    id = serializers.SlugRelatedField(
-        slug_field='id',
-        queryset=Ingredient.objects.all(),
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(required=True)
 
     def validate_amount(self, value):
@@ -248,17 +301,56 @@ class AmountSerialazer(serializers.Serializer):
         )
 
 
+class RawImageField(serializers.Field):
+    '''
+    Класс RawImageField.
+
+    Принимает картинку в base64 (в том числе с префиксом
+    data:image/...;base64,) и возвращает файл с исходными байтами.
+    В запросе читаются только заголовок и структура файла, точки
+    не декодируются: пережатие картинки выполняется в фоне
+    (api.images).
+    '''
+    default_error_messages = {
+        'invalid_image': serializers.ImageField.default_error_messages[
+            'invalid_image'
+        ],
+        'max_size': 'Image must not be larger than {max_size} bytes.',
+        'max_pixels': 'Image must not have more than {max_pixels} pixels.',
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid_image')
+        if ';base64,' in data:
+            data = data.split(';base64,', 1)[1]
+        try:
+            content = b64decode(data, validate=True)
+        except (binascii.Error, ValueError):
+            self.fail('invalid_image')
+        max_size = PROJECT_SETTINGS.get('image_max_upload_bytes')
+        if len(content) > max_size:
+            self.fail('max_size', max_size=max_size)
+        info = inspect_image(content)
+        if info is None:
+            self.fail('invalid_image')
+        extension, pixels = info
+        max_pixels = PROJECT_SETTINGS.get('image_max_pixels')
+        if pixels > max_pixels:
+            self.fail('max_pixels', max_pixels=max_pixels)
+        return ContentFile(content, name=f'{uuid4().hex}.{extension}')
+
+    def to_representation(self, value):
+        return value.url if value else None
+
+
 class ResipeEditSerializer(serializers.ModelSerializer):
     '''
     Класс ResipeEditSerializer.
     '''
     ingredients = AmountSerialazer(many=True, required=True)
-    tags = serializers.SlugRelatedField(
-        slug_field='id',
-        queryset=Tag.objects.all(),
-        many=True,
-    )
-    image = Base64ImageField(required=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = RawImageField(source='image_raw', required=True)
 
     class Meta:
         model = Recipe
@@ -280,29 +372,37 @@ class ResipeEditSerializer(serializers.ModelSerializer):
         )
 
     def validate_ingredients(self, values):
-        set_of_ingredients = set()
-        for value in values:
-            ingredient = value['id']
-            if ingredient not in set_of_ingredients:
-                set_of_ingredients.add(ingredient)
-            else:
-                raise serializers.ValidationError(
-                    'Ingredients should not be repeated!'
-                )
+        ids = [value['id'] for value in values]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Ingredients should not be repeated!'
+            )
+        self.check_known(ids, set(
+            Ingredient.objects.filter(pk__in=ids)
+            .values_list('pk', flat=True)
+        ))
         return values
 
     def validate_tags(self, values):
-        set_of_tags = set()
-        for value in values:
-            tag = value
-            if tag not in set_of_tags:
-                set_of_tags.add(tag)
-            else:
-                raise serializers.ValidationError(
-                    'Tags should not be repeated!'
-                )
+        if len(set(values)) != len(values):
+            raise serializers.ValidationError(
+                'Tags should not be repeated!'
+            )
+        self.check_known(values, tag_registry.known_ids())
         return values
 
+    @staticmethod
+    def check_known(ids, known):
+        '''
+        Сообщает сразу обо всех id, которых нет среди known.
+        '''
+        unknown = [pk for pk in ids if pk not in known]
+        if unknown:
+            raise serializers.ValidationError([
+                DOES_NOT_EXIST.format(slug_name='id', value=pk)
+                for pk in unknown
+            ])
+
     def validate(self, data):
         fields = self.Meta.fields
         err = []
@@ -315,70 +415,174 @@ class ResipeEditSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(err)
         return data
 
-    @transaction.atomic
     def create(self, validated_data):
+        '''
+        Исходный файл картинки сохраняется до транзакции и удаляется,
+        если рецепт записать не удалось.
+        '''
+        upload = validated_data.pop('image_raw')
+        with saved_upload('image_raw', upload) as image_raw:
+            return self.create_recipe(validated_data, image_raw)
+
+    @transaction.atomic
+    def create_recipe(self, validated_data, image_raw):
         user = self.context.get('user')
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe: Recipe = Recipe.objects.create(**validated_data, author=user)
-        for tag in tags:
-            recipe.tags.add(tag)
-        for data_value in ingredients:
-            ingredient = data_value['id']
-            amount = data_value['amount']
-            RecipeIngredientAmount.objects.create(
-                recipe=recipe, ingredient=ingredient, amount=amount
+        recipe: Recipe = Recipe.objects.create(
+            **validated_data, image_raw=image_raw, author=user,
+            image_state=IMAGE_PENDING,
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=pk) for pk in tags
+        )
+        RecipeIngredientAmount.objects.bulk_create(
+            RecipeIngredientAmount(
+                recipe=recipe, ingredient_id=value['id'],
+                amount=value['amount'],
             )
+            for value in ingredients
+        )
+        for model in (RecipeTag, RecipeIngredientAmount):
+            bulk_changed.send(sender=model, recipe_ids=(recipe.pk,))
+        image_pipeline.submit(recipe.pk)
         return recipe
 
-    @transaction.atomic
     def update(self, instance, validated_data):
+        '''
+        Новый исходный файл картинки сохраняется до транзакции
+        и удаляется, если рецепт записать не удалось.
+        '''
+        upload = validated_data.pop('image_raw', None)
+        with saved_upload('image_raw', upload) as image_raw:
+            if image_raw:
+                validated_data['image_raw'] = image_raw
+            return self.update_recipe(instance, validated_data)
+
+    @transaction.atomic
+    def update_recipe(self, instance, validated_data):
+        '''
+        Записывает только изменившиеся поля рецепта, а теги
+        и ингредиенты сравнивает с сохранёнными и применяет разницу.
+        Новая картинка отправляется на фоновую обработку.
+        '''
         recipe: Recipe = instance
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        for key, value in validated_data.items():
-            setattr(recipe, key, value)
-        recipe.save()
-
-        RecipeTag.objects.filter(recipe=recipe).delete()
-        for tag in tags:
-            recipe.tags.add(tag)
-
-        RecipeIngredientAmount.objects.filter(recipe=recipe).delete()
-        for data_value in ingredients:
-            ingredient = data_value['id']
-            amount = data_value['amount']
-            RecipeIngredientAmount.objects.create(
-                recipe=recipe, ingredient=ingredient, amount=amount
-            )
+        previous_raw = recipe.image_raw.name
+        if 'image_raw' in validated_data:
+            validated_data['image_state'] = IMAGE_PENDING
+        changed = [
+            key for key, value in validated_data.items()
+            if getattr(recipe, key) != value
+        ]
+        for key in changed:
+            setattr(recipe, key, validated_data[key])
+        if changed:
+            recipe.save(update_fields=changed)
+        self.update_tags(recipe, tags)
+        self.update_ingredients(recipe, ingredients)
+        if 'image_raw' in validated_data:
+            # Прежняя загрузка, не успевшая обработаться, больше
+            # не нужна; её задача увидит замену и ничего не запишет.
+            transaction.on_commit(lambda: delete_files(previous_raw))
+            image_pipeline.submit(recipe.pk)
         return recipe
 
+    @staticmethod
+    def update_tags(recipe, tags):
+        current = set(
+            RecipeTag.objects.filter(recipe=recipe)
+            .values_list('tag_id', flat=True)
+        )
+        removed = current - set(tags)
+        if removed:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=removed
+            ).delete()
+        added = [
+            RecipeTag(recipe=recipe, tag_id=pk)
+            for pk in tags if pk not in current
+        ]
+        if added:
+            RecipeTag.objects.bulk_create(added)
+            bulk_changed.send(sender=RecipeTag, recipe_ids=(recipe.pk,))
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        current = {
+            amount.ingredient_id: amount
+            for amount in RecipeIngredientAmount.objects.filter(recipe=recipe)
+        }
+        submitted = {value['id']: value for value in ingredients}
+        removed = set(current) - set(submitted)
+        if removed:
+            RecipeIngredientAmount.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        added = []
+        changed = []
+        for pk, value in submitted.items():
+            amount = current.get(pk)
+            if amount is None:
+                added.append(RecipeIngredientAmount(
+                    recipe=recipe, ingredient_id=pk, amount=value['amount'],
+                ))
+            elif amount.amount != value['amount']:
+                amount.amount = value['amount']
+                changed.append(amount)
+        if added:
+            RecipeIngredientAmount.objects.bulk_create(added)
+        if changed:
+            RecipeIngredientAmount.objects.bulk_update(changed, ('amount',))
+        if added or changed:
+            bulk_changed.send(
+                sender=RecipeIngredientAmount, recipe_ids=(recipe.pk,)
+            )
 
-class ResipeShortListSerializer(serializers.ListSerializer):
-    def to_representation(self, data):
-        """
-        List of object instances -> List of dicts of primitive datatypes.
-        """
-        request = self.context.get('request', None)
-        recipes_limit = None
-        if request:
-            recipes_limit = request.query_params.get('recipes_limit')
 
-        try:
-            recipes_limit = int(recipes_limit)
-        except ValueError:
-            recipes_limit = None
-        except TypeError:
-            recipes_limit = None
+def get_recipes_limit(request):
+    '''
+    Возвращает ограничение числа рецептов из параметра recipes_limit.
+    '''
+    if request is None:
+        return None
+    try:
+        recipes_limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit >= 0 else None
 
-        iterable = data.all()[:recipes_limit]
 
-        return [
-            self.child.to_representation(item) for item in iterable
-        ]
+class RecipeIdsSerializer(serializers.Serializer):
+    '''
+    Класс RecipeIdsSerializer для списка id рецептов в массовом
+    добавлении в избранное и список покупок и удалении оттуда.
+    '''
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=PROJECT_SETTINGS.get('bulk_toggle_max_ids', 100),
+    )
 
+    def validate_ids(self, ids):
+        '''
+        Убирает повторы, сохраняя порядок.
+        '''
+        return list(dict.fromkeys(ids))
 
-class ResipeShortSerializer(serializers.ModelSerializer):
+
+class ResipeShortListSerializer(ViewerStateListSerializer):
+    def get_iterable(self, data):
+        """
+        Ограничивает число рецептов параметром recipes_limit.
+        """
+        recipes_limit = get_recipes_limit(self.context.get('request', None))
+        return data.all()[:recipes_limit]
+
+
+class ResipeShortSerializer(PendingImageMixin, ViewerStateMixin,
+                            serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = (
@@ -389,15 +593,15 @@ class ResipeShortSerializer(serializers.ModelSerializer):
         )
         list_serializer_class = ResipeShortListSerializer
 
+    def prime_viewer_state(self, instances):
+        self.viewer_state.add_recipes(instances)
+
 
-class UserSubscribeSerializer(serializers.ModelSerializer):
+class UserSubscribeSerializer(ViewerStateMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(
         method_name='get_is_subscribed'
     )
     recipes = ResipeShortSerializer(many=True)
-    recipes_count = serializers.SerializerMethodField(
-        method_name='get_recipes_count'
-    )
 
     class Meta:
         model = User
@@ -407,17 +611,10 @@ class UserSubscribeSerializer(serializers.ModelSerializer):
             'is_subscribed', 'recipes',
             'recipes_count',
         )
+        list_serializer_class = ViewerStateListSerializer
 
-    def get_is_subscribed(self, user_obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            user: User = request.user
-            return (
-                SubscribeUser.objects
-                .filter(user=user, author=user_obj)
-                .exists()
-            )
-        return False
+    def prime_viewer_state(self, instances):
+        self.viewer_state.add_authors(instances)
 
-    def get_recipes_count(self, user_obj):
-        return user_obj.recipes.count()
+    def get_is_subscribed(self, user_obj):
+        return self.viewer_state.is_subscribed(user_obj)
@@ -0,0 +1,153 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from api.fragments import invalidate_fragments
+from api.versions import bump_versions
+from ingredients.models import Ingredient, MeasurementUnit
+from recipes.models import (Recipe, RecipeIngredientAmount, RecipeTag,
+                            UserFavoriteRecipe, UserShoppingCart)
+from recipes.signals import bulk_changed
+from tags.models import Tag
+from users.models import SubscribeUser
+
+User = get_user_model()
+
+WATCHED_MODELS = (
+    Recipe,
+    RecipeTag,
+    RecipeIngredientAmount,
+    UserFavoriteRecipe,
+    UserShoppingCart,
+    Tag,
+    Ingredient,
+    MeasurementUnit,
+    User,
+    SubscribeUser,
+)
+
+
+def now_and_on_commit(func, *args):
+    '''
+    Выполняет func сразу и ещё раз после фиксации транзакции:
+    иначе кэш, заполненный между записью и фиксацией, сохранил бы
+    старые данные под новой версией.
+    '''
+    func(*args)
+    transaction.on_commit(lambda: func(*args))
+
+
+def model_changed(sender, **kwargs):
+    '''
+    Отмечает изменение данных модели.
+    '''
+    now_and_on_commit(bump_versions, sender)
+
+
+def relation_changed(sender, action, **kwargs):
+    '''
+    Отмечает изменение связей рецепта через add/remove/clear.
+    '''
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        now_and_on_commit(bump_versions, sender)
+
+
+def recipe_saved(sender, instance, **kwargs):
+    now_and_on_commit(invalidate_fragments, (instance.pk,))
+
+
+def recipe_part_saved(sender, instance, **kwargs):
+    now_and_on_commit(invalidate_fragments, (instance.recipe_id,))
+
+
+def author_saved(sender, instance, **kwargs):
+    now_and_on_commit(
+        invalidate_fragments,
+        list(
+            Recipe.objects.filter(author=instance)
+            .values_list('pk', flat=True)
+        ),
+    )
+
+
+def models_bulk_changed(sender, recipe_ids=(), **kwargs):
+    '''
+    Отмечает массовое изменение модели и сбрасывает фрагменты
+    затронутых рецептов.
+    '''
+    now_and_on_commit(bump_versions, sender)
+    if sender in (Recipe, RecipeTag, RecipeIngredientAmount):
+        now_and_on_commit(invalidate_fragments, list(recipe_ids))
+
+
+def recipe_parts_changed(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    '''
+    Сбрасывает фрагменты рецептов при изменении тегов
+    и ингредиентов через add/remove/clear.
+    '''
+    if not reverse:
+        if action.startswith('post_'):
+            now_and_on_commit(invalidate_fragments, (instance.pk,))
+        return
+    if action == 'pre_clear':
+        now_and_on_commit(
+            invalidate_fragments,
+            list(
+                sender.objects.filter(
+                    **{sender_field(sender, instance): instance}
+                ).values_list('recipe_id', flat=True)
+            ),
+        )
+    elif action in ('post_add', 'post_remove'):
+        now_and_on_commit(invalidate_fragments, set(pk_set))
+
+
+def sender_field(through, instance) -> str:
+    for field in through._meta.get_fields():
+        if getattr(field, 'related_model', None) is type(instance):
+            return field.name
+    raise LookupError(f'{through} has no relation to {type(instance)}')
+
+
+FRAGMENT_RECEIVERS = (
+    (Recipe, recipe_saved),
+    (RecipeTag, recipe_part_saved),
+    (RecipeIngredientAmount, recipe_part_saved),
+    (User, author_saved),
+)
+
+
+def connect_signals():
+    for model, receiver in FRAGMENT_RECEIVERS:
+        label = model._meta.label_lower
+        post_save.connect(
+            receiver, sender=model,
+            dispatch_uid=f'api_fragments_save_{label}',
+        )
+        post_delete.connect(
+            receiver, sender=model,
+            dispatch_uid=f'api_fragments_delete_{label}',
+        )
+
+    for model in WATCHED_MODELS:
+        post_save.connect(
+            model_changed, sender=model,
+            dispatch_uid=f'api_versions_save_{model._meta.label_lower}',
+        )
+        post_delete.connect(
+            model_changed, sender=model,
+            dispatch_uid=f'api_versions_delete_{model._meta.label_lower}',
+        )
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        m2m_changed.connect(
+            relation_changed, sender=through,
+            dispatch_uid=f'api_versions_m2m_{through._meta.label_lower}',
+        )
+        m2m_changed.connect(
+            recipe_parts_changed, sender=through,
+            dispatch_uid=f'api_fragments_m2m_{through._meta.label_lower}',
+        )
+    bulk_changed.connect(
+        models_bulk_changed, dispatch_uid='api_versions_bulk_changed'
+    )
@@ -0,0 +1,12 @@
+from api.checks import require_shared_cache
+
+
+def start_worker():
+    '''
+    Проверки и прогрев при запуске воркера (wsgi.py), после
+    загрузки приложений.
+    '''
+    from api.catalogue import warm_ingredient_index
+
+    require_shared_cache()
+    warm_ingredient_index()
@@ -0,0 +1,86 @@
+import re
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+SQL_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudget(namedtuple('QueryBudget', ('base', 'per_item'))):
+    '''
+    Допустимое число запросов к базе: base плюс per_item на каждый
+    элемент страницы. Для O(1) по размеру страницы per_item = 0.
+    '''
+    def limit(self, items=0) -> int:
+        return self.base + self.per_item * items
+
+
+def normalize_sql(sql) -> str:
+    return SQL_LITERAL_RE.sub('?', sql)
+
+
+def describe_queries(queries) -> str:
+    '''
+    Описание запросов для сообщения об ошибке: сначала повторяющиеся
+    запросы с числом повторов, затем все запросы по порядку.
+    '''
+    repeated = Counter(normalize_sql(query['sql']) for query in queries)
+    lines = ['Repeated queries:']
+    lines.extend(
+        f'  {count} x {sql}'
+        for sql, count in repeated.most_common() if count > 1
+    )
+    lines.append('All queries:')
+    lines.extend(
+        f'  {number}. {query["sql"]}'
+        for number, query in enumerate(queries, start=1)
+    )
+    return '\n'.join(lines)
+
+
+class QueryBudgetMixin:
+    '''
+    Класс QueryBudgetMixin для тестов API.
+
+    query_budgets задаёт QueryBudget для адресов по имени.
+    assertQueryBudget проверяет, что запрос укладывается в бюджет,
+    assertConstantQueries - что число запросов не растёт вместе
+    с данными. При ошибке выводятся повторяющиеся запросы.
+    '''
+    query_budgets = {}
+
+    @contextmanager
+    def assertQueryBudget(self, name, items=0):  # noqa: N802
+        limit = self.query_budgets[name].limit(items)
+        # Тестовый клиент очищает журнал запросов в начале каждого
+        # запроса, поэтому блок должен содержать один запрос к API.
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        queries = context.captured_queries
+        if len(queries) > limit:
+            self.fail(
+                f'{name}: {len(queries)} queries, budget {limit}\n'
+                + describe_queries(queries)
+            )
+
+    def assertConstantQueries(self, name, request, grow):  # noqa: N802
+        '''
+        Выполняет request до и после grow и сравнивает число запросов;
+        оба раза запрос должен уложиться в бюджет name.
+        '''
+        with self.assertQueryBudget(name) as before:
+            request()
+        before = before.captured_queries
+        grow()
+        with self.assertQueryBudget(name) as after:
+            request()
+        after = after.captured_queries
+        if len(after) != len(before):
+            self.fail(
+                f'{name}: {len(before)} queries before and '
+                f'{len(after)} after adding data\n'
+                + describe_queries(after)
+            )
@@ -0,0 +1,105 @@
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.benchmark import (BENCHMARK_ENDPOINTS, benchmark_meta,
+                           benchmark_scale, compare_reports)
+from api.loaddata import LoadDataGenerator
+from recipes.models import Recipe, RecipeIngredientAmount
+
+User = get_user_model()
+
+
+class BenchmarkTests(TestCase):
+    '''
+    Прогоняем замеры API на небольшом масштабе.
+    Масштаб и файл отчёта задаются переменными окружения
+    BENCHMARK_SCALE и BENCHMARK_OUTPUT.
+    '''
+    def test_api_benchmark_01_endpoints(self):
+        '''
+        Проверяем, что все адреса отвечают и отчёт полон.
+        '''
+        self.addCleanup(cache.clear)
+        scale = os.getenv('BENCHMARK_SCALE', '50')
+        results = benchmark_scale(int(scale), repeat=3)
+        self.assertEqual(
+            set(results), {name for name, _ in BENCHMARK_ENDPOINTS}
+        )
+        for name, result in results.items():
+            with self.subTest(name=name):
+                self.assertEqual(result['status'], 200)
+                for prefix in ('cold', 'warm'):
+                    self.assertLessEqual(
+                        result[f'{prefix}_p50_ms'], result[f'{prefix}_p99_ms']
+                    )
+                self.assertLessEqual(
+                    result['warm_queries'], result['queries']
+                )
+
+        report = {'meta': benchmark_meta(), 'scales': {scale: results}}
+        output = os.getenv('BENCHMARK_OUTPUT')
+        if output:
+            with open(output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        self.assertEqual(compare_reports(report, report), [])
+
+        slower = json.loads(json.dumps(report))
+        slower['scales'][scale]['recipes.list']['cold_p50_ms'] += 1000
+        slower['scales'][scale]['recipes.list']['warm_p50_ms'] += 1000
+        slower['scales'][scale]['recipes.list']['queries'] += 1
+        self.assertEqual(len(compare_reports(slower, report)), 3)
+        self.assertLess(
+            results['ingredients.list']['warm_queries'],
+            results['ingredients.list']['queries'],
+        )
+
+
+class LoadDataTests(TestCase):
+    '''
+    Проверяем генератор данных для нагрузочного тестирования.
+    '''
+    def generate(self, seed):
+        messages = []
+        written = LoadDataGenerator(
+            users=20, recipes=60, seed=seed, chunk=25,
+            progress=messages.append,
+        ).run()
+        first_user = User.objects.filter(
+            username__startswith='load').order_by('id').first().id
+        first_recipe = Recipe.objects.order_by('id').first().id
+        shape = [
+            (recipe_id - first_recipe, author_id - first_user)
+            for recipe_id, author_id in Recipe.objects.order_by('id')
+            .values_list('id', 'author_id')
+        ]
+        return written, messages, shape
+
+    def test_api_load_data_01_generate(self):
+        '''
+        Проверяем число записей, счётчики, прогресс и воспроизводимость.
+        '''
+        self.addCleanup(cache.clear)
+        written, messages, shape = self.generate(seed=1)
+        self.assertEqual(written['users.User'], 20)
+        self.assertEqual(written['recipes.Recipe'], 60)
+        self.assertEqual(
+            written['recipes.RecipeIngredientAmount'],
+            RecipeIngredientAmount.objects.count(),
+        )
+        self.assertTrue(any('recipes.Recipe: 25 rows' in m for m in messages))
+
+        top_author = User.objects.order_by('-recipes_count', 'id').first()
+        self.assertEqual(
+            top_author.recipes_count,
+            Recipe.objects.filter(author=top_author).count(),
+        )
+        self.assertGreater(top_author.recipes_count, 60 / 20)
+
+        User.objects.filter(username__startswith='load').delete()
+        self.assertEqual(self.generate(seed=1)[2], shape)
+        User.objects.filter(username__startswith='load').delete()
+        self.assertNotEqual(self.generate(seed=2)[2], shape)
@@ -0,0 +1,31 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from api.checks import check_shared_cache, require_shared_cache
+
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+}}
+MEMCACHED = {'default': {
+    'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+    'LOCATION': 'memcached:11211',
+}}
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    '''
+    Тестируем требование общего кэша при выключенном DEBUG.
+    '''
+    def test_api_checks_01_shared_cache(self):
+        with override_settings(DEBUG=False, CACHES=LOCMEM):
+            self.assertEqual(
+                [error.id for error in check_shared_cache(None)],
+                ['api.E001'],
+            )
+            with self.assertRaises(ImproperlyConfigured):
+                require_shared_cache()
+        for debug, caches in ((True, LOCMEM), (False, MEMCACHED)):
+            with self.subTest(debug=debug):
+                with override_settings(DEBUG=debug, CACHES=caches):
+                    self.assertEqual(check_shared_cache(None), [])
+                    require_shared_cache()
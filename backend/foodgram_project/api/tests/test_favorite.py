@@ -14,6 +14,8 @@ from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient, APITestCase, override_settings
 from tags.models import Tag
 
+from api.tests.budgets import QueryBudget, QueryBudgetMixin
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
@@ -26,10 +28,14 @@ def add_num_to_value(d: dict, value: int):
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class FavoriteTest(APITestCase):
+class FavoriteTest(QueryBudgetMixin, APITestCase):
     '''
     Тестируем модель /api/recipes/{id}/favorite/.
     '''
+    query_budgets = {
+        'recipes-favorite': QueryBudget(6, 0),
+    }
+
     @classmethod
     def setUpClass(cls):
         '''
@@ -218,3 +224,15 @@ class FavoriteTest(APITestCase):
         resp = self.auth_client1.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(resp.json().get('count'), 0)
+
+    def test_api_recipes_favorite_query_budget(self):
+        '''
+        Тестируем бюджет запросов добавления в избранное и удаления.
+        '''
+        url = f'/api/recipes/{FavoriteTest.recipe.id}/favorite/'
+        with self.assertQueryBudget('recipes-favorite'):
+            resp = self.auth_client1.post(url)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        with self.assertQueryBudget('recipes-favorite'):
+            resp = self.auth_client1.delete(url)
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
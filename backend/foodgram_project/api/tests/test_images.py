@@ -0,0 +1,237 @@
+import base64
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from ingredients.models import Ingredient, MeasurementUnit
+from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
+from recipes.models import Recipe
+from rest_framework import status
+from rest_framework.test import APITestCase, override_settings
+from tags.models import Tag
+
+from api.images import image_pipeline, process_recipe_image, render_image
+from foodgram_project.settings import PROJECT_SETTINGS
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+def png_base64(size=(2000, 1000), mode='RGBA') -> str:
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 50, 50, 128)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImagePipelineTest(APITestCase):
+    '''
+    Тестируем фоновую обработку картинок рецептов.
+    '''
+    url = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', password='pass',
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', slug='breakfast', color='#E26C2D'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit=MeasurementUnit.objects.create(
+                name='г'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.client.force_authenticate(self.author)
+
+    def data(self, image) -> dict:
+        return {
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+            'tags': [self.tag.pk],
+            'image': image,
+            'name': 'Рецепт',
+            'text': 'Текст',
+            'cooking_time': 5,
+        }
+
+    def create(self, image, **project_settings):
+        with mock.patch.dict(PROJECT_SETTINGS, project_settings):
+            return self.client.post(
+                self.url, self.data(image), format='json'
+            )
+
+    def test_api_images_01_background(self):
+        '''
+        Проверяем, что картинка сохраняется как есть, а рецепт
+        до окончания обработки отдаёт её состояние и исходный файл.
+        '''
+        resp = self.create(png_base64())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.json()['image_state'], 'pending')
+        recipe = Recipe.objects.get(pk=resp.json()['id'])
+        self.assertTrue(recipe.image_raw.name.endswith('.png'))
+        self.assertTrue(resp.json()['image'].endswith(recipe.image_raw.url))
+        raw_path = recipe.image_raw.path
+        for url in (f'{self.url}{recipe.pk}/', self.url):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                data = data.get('results', [data])[0]
+                self.assertTrue(data['image'].endswith(recipe.image_raw.url))
+
+        self.assertEqual(process_recipe_image(recipe.pk), 'ready')
+        self.assertIsNone(process_recipe_image(recipe.pk))
+        recipe.refresh_from_db()
+        self.assertFalse(recipe.image_raw)
+        with self.assertRaises(FileNotFoundError):
+            open(raw_path, 'rb')
+        with Image.open(recipe.image.path) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (1600, 800)))
+        with Image.open(recipe.image_thumbnail.path) as image:
+            self.assertEqual(image.size, (400, 200))
+
+        resp = self.client.get(f'{self.url}{recipe.pk}/')
+        self.assertEqual(resp.json()['image_state'], 'ready')
+        self.assertTrue(resp.json()['image'].endswith('.jpg'))
+
+    def test_api_images_06_pending_recipe_is_valid(self):
+        '''
+        Проверяем, что рецепт без обработанной картинки проходит
+        проверку модели (правка в админке).
+        '''
+        resp = self.create(png_base64((10, 10)))
+        recipe = Recipe.objects.get(pk=resp.json()['id'])
+        self.assertFalse(recipe.image)
+        recipe.full_clean()
+
+    def test_api_images_02_inline_and_update(self):
+        '''
+        Проверяем обработку в запросе и замену картинки: прежняя
+        картинка отдаётся до окончания обработки, а необработанная
+        загрузка, которую заменили, удаляется.
+        '''
+        resp = self.create(png_base64(mode='RGB'), image_workers=0)
+        self.assertEqual(resp.json()['image_state'], 'ready')
+        recipe_url = f'{self.url}{resp.json()["id"]}/'
+        first_image = resp.json()['image']
+
+        resp = self.client.patch(
+            recipe_url, self.data(png_base64((300, 300))), format='json'
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()['image_state'], 'pending')
+        self.assertEqual(resp.json()['image'], first_image)
+        raw_path = Recipe.objects.get(pk=resp.json()['id']).image_raw.path
+
+        # Тест идёт в транзакции, которая не фиксируется: колбэки
+        # on_commit выполняем сразу, а обработку не запускаем.
+        with mock.patch.object(image_pipeline, 'submit'), mock.patch(
+            'django.db.transaction.on_commit', lambda func: func()
+        ):
+            resp = self.client.patch(
+                recipe_url, self.data(png_base64((200, 200))), format='json'
+            )
+        self.assertEqual(resp.json()['image'], first_image)
+        with self.assertRaises(FileNotFoundError):
+            open(raw_path, 'rb')
+
+        recipe = Recipe.objects.get(pk=resp.json()['id'])
+        previous = (recipe.image.path, recipe.image_thumbnail.path)
+        with mock.patch(
+            'django.db.transaction.on_commit', lambda func: func()
+        ):
+            call_command('process_recipe_images', stdout=StringIO())
+        resp = self.client.get(recipe_url)
+        self.assertEqual(resp.json()['image_state'], 'ready')
+        self.assertNotEqual(resp.json()['image'], first_image)
+        for path in previous:
+            with self.subTest(path=path):
+                with self.assertRaises(FileNotFoundError):
+                    open(path, 'rb')
+
+    def test_api_images_03_invalid(self):
+        '''
+        Проверяем отказ в запросе по сигнатуре, структуре, размеру
+        файла и числу точек.
+        '''
+        broken = base64.b64encode(b'\x89PNG\r\n\x1a\n' + b'0' * 64).decode()
+        for image, project_settings in (
+            ('vfbvfbvjfb', {}),
+            (base64.b64encode(b'not an image').decode(), {}),
+            (broken, {}),
+            (png_base64((10, 10)), {'image_max_upload_bytes': 10}),
+            (png_base64((10, 10)), {'image_max_pixels': 99}),
+        ):
+            with self.subTest(image=image[:20], settings=project_settings):
+                resp = self.create(image, **project_settings)
+                self.assertEqual(
+                    resp.status_code, status.HTTP_400_BAD_REQUEST
+                )
+                self.assertIn('image', resp.json())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_api_images_04_failed(self):
+        '''
+        Проверяем ошибку обработки: состояние failed, исходный файл
+        удаляется, картинки у рецепта нет.
+        '''
+        with mock.patch('api.images.render_image', return_value=None):
+            resp = self.create(png_base64((10, 10)), image_workers=0)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.json()['image_state'], 'failed')
+        self.assertIsNone(resp.json()['image'])
+        recipe = Recipe.objects.get(pk=resp.json()['id'])
+        self.assertFalse(recipe.image_raw)
+
+    def test_api_images_05_render_limits(self):
+        '''
+        Проверяем, что render_image не декодирует картинку больше
+        image_max_pixels точек, а JPEG декодирует с уменьшением.
+        '''
+        buffer = BytesIO()
+        Image.new('RGB', (2000, 1000), (200, 50, 50)).save(buffer, 'JPEG')
+        with mock.patch.dict(PROJECT_SETTINGS, {'image_max_pixels': 10 ** 6}):
+            self.assertIsNone(render_image(buffer.getvalue()))
+        with mock.patch.object(
+            JpegImageFile, 'draft', autospec=True,
+            side_effect=JpegImageFile.draft,
+        ) as draft:
+            full, thumbnail = render_image(buffer.getvalue())
+        draft.assert_called_once_with(mock.ANY, 'RGB', (1600, 1600))
+        with Image.open(BytesIO(full)) as image:
+            self.assertEqual(image.size, (1600, 800))
+
+    def test_api_images_07_rollback_deletes_upload(self):
+        '''
+        Проверяем, что исходный файл удаляется, если рецепт записать
+        не удалось.
+        '''
+        raw_dir = os.path.join(TEMP_MEDIA_ROOT, 'recipes', 'raw')
+        before = set(os.listdir(raw_dir)) if os.path.isdir(raw_dir) else set()
+        with mock.patch(
+            'recipes.models.RecipeTag.objects.bulk_create',
+            side_effect=IntegrityError,
+        ):
+            with self.assertRaises(IntegrityError):
+                self.create(png_base64((10, 10)))
+        self.assertEqual(set(os.listdir(raw_dir)), before)
+        self.assertFalse(Recipe.objects.exists())
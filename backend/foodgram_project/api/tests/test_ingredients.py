@@ -1,12 +1,24 @@
+from unittest import mock
+
+from django.core.cache import cache
 from ingredients.models import Ingredient, MeasurementUnit
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
+from api.catalogue import ingredient_index
+from api.search import trigram_similarity
+from api.tests.budgets import QueryBudget, QueryBudgetMixin
+from foodgram_project.settings import PROJECT_SETTINGS
+
 
-class IngredientsTests(APITestCase):
+class IngredientsTests(QueryBudgetMixin, APITestCase):
     '''
     Тестируем /api/ingredients/.
     '''
+    query_budgets = {
+        'ingredients-list': QueryBudget(1, 0),
+    }
+
     @classmethod
     def setUpClass(cls):
         '''
@@ -152,7 +164,11 @@ class IngredientsTests(APITestCase):
             )
         self.assertIsInstance(resp_data, list, 'В ответе не list')
         self.assertEqual(
-            len(resp_data), 2, 'В ответе не то число элементов списка'
+            len(resp_data), 4, 'В ответе не то число элементов списка'
+        )
+        self.assertEqual(
+            [ingrid_data['id'] for ingrid_data in resp_data], [1, 2, 4, 5],
+            'Совпадения по началу названия должны идти первыми'
         )
         for ingrid_data in resp_data:
             with self.subTest(ingrid_data=ingrid_data):
@@ -177,3 +193,169 @@ class IngredientsTests(APITestCase):
                     self.assertEqual(
                         ingrid_data[field_name], value
                     )
+
+    def test_api_ingredients_07_name_index(self):
+        '''
+        Проверяем подсказки из индекса в памяти и запасной путь через базу.
+        '''
+        self.addCleanup(cache.clear)
+        url = IngredientsTests.base_url + '?name=ING&limit=3'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+        self.assertEqual(
+            [ingrid_data['id'] for ingrid_data in resp.json()], [1, 2, 4]
+        )
+
+        Ingredient.objects.create(
+            id=6, name='Ing_0', measurement_unit=IngredientsTests.mu_2)
+        resp = self.client.get(url)
+        self.assertEqual(
+            resp.json()[0],
+            {'id': 6, 'name': 'Ing_0', 'measurement_unit': 'mu_2'},
+            'Индекс не обновился после добавления ингредиента'
+        )
+
+        with mock.patch(
+            'api.catalogue.ingredient_index.search', return_value=None
+        ):
+            fallback = self.client.get(url)
+        self.assertEqual(fallback.json(), resp.json())
+
+    def test_api_ingredients_08_name_fuzzy(self):
+        '''
+        Проверяем нечёткий поиск ингредиентов по триграммам.
+        '''
+        self.addCleanup(cache.clear)
+        self.assertAlmostEqual(
+            trigram_similarity('word', 'two words'), 0.363636, places=5
+        )
+        potato = Ingredient.objects.create(
+            id=7, name='Картофель', measurement_unit=IngredientsTests.mu_1)
+        Ingredient.objects.create(
+            id=8, name='Картофель молодой',
+            measurement_unit=IngredientsTests.mu_1)
+        Ingredient.objects.create(
+            id=9, name='Морковь', measurement_unit=IngredientsTests.mu_1)
+        url = IngredientsTests.base_url + '?name=картошель&fuzzy=1'
+
+        resp = self.client.get(url)
+        self.assertEqual(
+            [ingrid_data['id'] for ingrid_data in resp.json()], [7, 8]
+        )
+        self.assertEqual(resp.json()[0]['name'], potato.name)
+
+        with mock.patch(
+            'api.catalogue.ingredient_index.fuzzy', return_value=None
+        ):
+            fallback = self.client.get(url)
+        self.assertEqual(fallback.json(), resp.json())
+
+        with mock.patch.dict(PROJECT_SETTINGS, {'ingredient_fuzzy_limit': 1}):
+            for limit in ('', '&limit=5'):
+                with self.subTest(limit=limit):
+                    capped = self.client.get(url + limit)
+                    self.assertEqual(
+                        [ingrid_data['id'] for ingrid_data in capped.json()],
+                        [7],
+                    )
+
+        resp = self.client.get(
+            IngredientsTests.base_url + '?name=картошель')
+        self.assertEqual(resp.json(), [])
+
+    def test_api_ingredients_09_prerendered_list(self):
+        '''
+        Проверяем, что полный список и подсказки берутся из памяти.
+        '''
+        self.addCleanup(cache.clear)
+        url = IngredientsTests.base_url
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+            limited = self.client.get(url + '?limit=2')
+        self.assertEqual(len(resp.json()), 5)
+        self.assertEqual(limited.json(), resp.json()[:2])
+
+    def test_api_ingredients_10_query_budget(self):
+        '''
+        Проверяем, что поиск по базе, без индекса в памяти,
+        выполняется запросом, не зависящим от числа ингредиентов.
+        '''
+        url = IngredientsTests.base_url + '?name=ing'
+
+        def add_ingredients():
+            for num in range(10, 15):
+                Ingredient.objects.create(
+                    id=num, name=f'ing_{num}',
+                    measurement_unit=IngredientsTests.mu_2)
+
+        with mock.patch.dict(PROJECT_SETTINGS, {'ingredient_index': False}):
+            self.assertConstantQueries(
+                'ingredients-list', lambda: self.client.get(url),
+                add_ingredients
+            )
+            self.assertEqual(len(self.client.get(url).json()), 9)
+
+    def test_api_ingredients_11_index_substrings(self):
+        '''
+        Проверяем, что совпадения внутри названия, отобранные
+        по триграммам, совпадают с полным перебором.
+        '''
+        self.addCleanup(cache.clear)
+        for num, name in enumerate((
+            'Картофель', 'Картофель молодой', 'Мука пшеничная',
+            'Соль морская', 'Сахар-песок', 'Пшено',
+        ), start=20):
+            Ingredient.objects.create(
+                id=num, name=name, measurement_unit=IngredientsTests.mu_1)
+        ingredient_index.reset()
+        ingredient_index.search('')
+        keys = ingredient_index._data.keys
+        for needle in (
+            'ка', 'к', 'офел', 'пшен', 'ль м', '-', 'ар-п', 'ing', '_',
+            'zz', 'картофель молодой',
+        ):
+            expected = [
+                key for key in keys if key.startswith(needle)
+            ] + [
+                key for key in keys
+                if needle in key and not key.startswith(needle)
+            ]
+            with self.subTest(needle=needle):
+                self.assertEqual([
+                    item['name'].lower()
+                    for item in ingredient_index.search(needle)
+                ], expected)
+                with mock.patch.object(
+                    ingredient_index, 'substring_candidates',
+                    return_value=None,
+                ):
+                    self.assertEqual([
+                        item['name'].lower()
+                        for item in ingredient_index.search(needle)
+                    ], expected)
+
+    def test_api_ingredients_12_index_warm_and_background(self):
+        '''
+        Проверяем прогрев индекса при запуске воркера и перестроение
+        в отдельном потоке: пока оно идёт, запрос обслуживает база.
+        '''
+        self.addCleanup(cache.clear)
+        self.addCleanup(setattr, ingredient_index, 'background', False)
+        ingredient_index.reset()
+        ingredient_index.warm()
+        self.assertTrue(ingredient_index.background)
+        with mock.patch('api.catalogue.Thread') as thread:
+            self.assertEqual(len(ingredient_index.search('ing')), 4)
+            thread.assert_not_called()
+
+            Ingredient.objects.create(
+                id=30, name='ing_30', measurement_unit=IngredientsTests.mu_1)
+            self.assertIsNone(ingredient_index.search('ing'))
+            thread.assert_called_once()
+            resp = self.client.get(IngredientsTests.base_url + '?name=ing')
+            self.assertEqual(len(resp.json()), 5)
+
+        ingredient_index.refresh()
+        self.assertEqual(len(ingredient_index.search('ing')), 5)
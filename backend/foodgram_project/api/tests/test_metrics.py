@@ -0,0 +1,144 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from api.metrics import MetricsRegistry, RequestCollector, merge
+from tags.models import Tag
+
+
+class MetricsTests(APITestCase):
+    '''
+    Тестируем сбор метрик по представлениям и адрес /api/metrics/.
+    '''
+    url = '/api/metrics/'
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.registry = MetricsRegistry(self.directory)
+        patcher = mock.patch('api.metrics.metrics_registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Tag.objects.create(name='Завтрак', slug='breakfast', color='#E26C2D')
+
+    def test_api_metrics_01_views(self):
+        '''
+        Проверяем счётчики запросов, гистограмму, запросы к базе
+        и обращения к кэшу по представлениям.
+        '''
+        for _ in range(2):
+            self.client.get('/api/tags/')
+        self.client.get('/api/recipes/')
+        self.client.get('/api/nowhere/')
+
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain'))
+        text = resp.content.decode()
+        for line in (
+            'foodgram_requests_total{view="TagViewSet.list",method="GET",'
+            'status="200"} 2',
+            'foodgram_requests_total{view="RecipeViewSet.list",method="GET",'
+            'status="200"} 1',
+            'foodgram_requests_total{view="unmatched",method="GET",'
+            'status="404"} 1',
+            'foodgram_request_duration_seconds_bucket'
+            '{view="TagViewSet.list",le="+Inf"} 2',
+            'foodgram_request_duration_seconds_count'
+            '{view="TagViewSet.list"} 2',
+            'foodgram_cache_requests_total{view="TagViewSet.list",'
+            'cache="prerendered",result="hit"} 1',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text.splitlines())
+        self.assertRegex(
+            text, r'foodgram_db_queries_total\{view="RecipeViewSet.list"\} '
+                  r'[1-9]'
+        )
+
+    def test_api_metrics_02_internal_only(self):
+        '''
+        Проверяем, что метрики недоступны извне и через прокси.
+        '''
+        resp = self.client.get(self.url, REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        resp = self.client.get(self.url, HTTP_X_FORWARDED_FOR='203.0.113.5')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+        resp = self.client.get(self.url, REMOTE_ADDR='172.18.0.4')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_api_metrics_03_workers(self):
+        '''
+        Проверяем сложение снимков нескольких процессов
+        и удаление устаревших снимков.
+        '''
+        other = MetricsRegistry(self.directory)
+        other.started -= 1
+        for registry in (self.registry, other):
+            registry.observe(
+                'RecipeViewSet.list', 'GET', 200, 0.02, RequestCollector()
+            )
+        other.flush(force=True)
+        data = self.registry.collect()
+        self.assertEqual(
+            data['requests']['RecipeViewSet.list']['GET']['200'], 2
+        )
+        self.assertEqual(
+            data['latency']['RecipeViewSet.list']['buckets'][2], 2
+        )
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+        os.utime(other.filename, (0, 0))
+        data = self.registry.collect()
+        self.assertEqual(
+            data['requests']['RecipeViewSet.list']['GET']['200'], 1
+        )
+        self.assertEqual(os.listdir(self.directory), [
+            os.path.basename(self.registry.filename)
+        ])
+        self.assertEqual(
+            merge({'a': [1, 2], 'b': {'c': 1}}, {'a': [1, 1], 'b': {'c': 2}}),
+            {'a': [2, 3], 'b': {'c': 3}},
+        )
+
+    def test_api_metrics_04_flush_errors(self):
+        '''
+        Проверяем, что ошибка записи снимка не ломает запрос
+        и не оставляет временных файлов.
+        '''
+        self.registry.flush_interval = 0
+        with mock.patch(
+            'api.metrics.os.replace', side_effect=FileNotFoundError
+        ), self.assertLogs('api.metrics', 'ERROR'):
+            resp = self.client.get('/api/tags/')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(os.listdir(self.directory), [])
+
+        self.client.get('/api/tags/')
+        self.assertEqual(os.listdir(self.directory), [
+            os.path.basename(self.registry.filename)
+        ])
+
+        errors = []
+
+        def flush_many():
+            try:
+                for _ in range(20):
+                    self.registry.flush(force=True)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=flush_many) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(os.listdir(self.directory)), 1)
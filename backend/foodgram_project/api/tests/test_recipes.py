@@ -1,10 +1,15 @@
 import base64
+import json
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from ingredients.models import Ingredient, MeasurementUnit
 from recipes.models import (Recipe, RecipeIngredientAmount, RecipeTag,
                             UserFavoriteRecipe, UserShoppingCart)
@@ -13,6 +18,15 @@ from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient, APITestCase, override_settings
 from tags.models import Tag
 
+from api.builders import RecipeValuesBuilder
+from api.catalogue import tag_registry
+from api.fragments import (RecipeFragmentRenderer, get_fragments,
+                           serialize_fragments)
+from api.serializers import ResipeSerializer
+from api.tests.budgets import QueryBudget, QueryBudgetMixin
+from api.versions import bump_versions
+from foodgram_project.settings import PROJECT_SETTINGS
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
@@ -25,10 +39,16 @@ def add_num_to_value(d: dict, value: int):
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class RecipesTest(APITestCase):
+class RecipesTest(QueryBudgetMixin, APITestCase):
     '''
     Тестируем модель /api/recipes/.
     '''
+    query_budgets = {
+        'recipes-list': QueryBudget(6, 0),
+        'recipes-detail': QueryBudget(4, 0),
+        'recipes-create': QueryBudget(14, 0),
+    }
+
     @classmethod
     def setUpClass(cls):
         '''
@@ -176,6 +196,7 @@ class RecipesTest(APITestCase):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_state',
             'text',
             'cooking_time'
         ]
@@ -328,6 +349,7 @@ class RecipesTest(APITestCase):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_state',
             'text',
             'cooking_time'
         ]
@@ -388,6 +410,7 @@ class RecipesTest(APITestCase):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_state',
             'text',
             'cooking_time'
         ]
@@ -787,3 +810,471 @@ class RecipesTest(APITestCase):
         resp = self.author_client.delete(url)
         self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Recipe.objects.count(), count_recipes - 1)
+
+    def test_api_recipes_07_list_constant_queries(self):
+        '''
+        Тестируем, что число запросов списка рецептов не зависит
+        от числа рецептов на странице.
+        '''
+        url = RecipesTest.url
+
+        def add_recipes():
+            for num in range(5):
+                recipe = Recipe.objects.create(
+                    author=RecipesTest.user2, name=f'Рецепт {num}',
+                    text='Текст', cooking_time=5, image=RecipesTest.uploaded
+                )
+                RecipeTag.objects.create(recipe=recipe, tag=RecipesTest.tag1)
+                RecipeTag.objects.create(recipe=recipe, tag=RecipesTest.tag3)
+                RecipeIngredientAmount.objects.create(
+                    recipe=recipe, ingredient=RecipesTest.ingredient1,
+                    amount=1)
+                RecipeIngredientAmount.objects.create(
+                    recipe=recipe, ingredient=RecipesTest.ingredient2,
+                    amount=3)
+                UserFavoriteRecipe.objects.create(
+                    user=RecipesTest.user1, recipe=recipe)
+
+        self.assertConstantQueries(
+            'recipes-list', lambda: self.auth_client1.get(url), add_recipes
+        )
+        resp = self.auth_client1.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.json()['results']), 6)
+        favorited = {
+            item['id']: item['is_favorited']
+            for item in resp.json()['results']
+        }
+        self.assertFalse(favorited[RecipesTest.recipe.id])
+        self.assertEqual(sum(favorited.values()), 5)
+
+    def test_api_recipes_08_cursor_pagination(self):
+        '''
+        Тестируем постраничный вывод по курсору.
+        '''
+        for name in ('Б', 'В', 'Г', 'Д', 'Д'):
+            Recipe.objects.create(
+                author=RecipesTest.author, name=name, text='Текст',
+                cooking_time=5, image=RecipesTest.uploaded
+            )
+        expected = list(
+            Recipe.objects.order_by('name', 'id').values_list('id', flat=True)
+        )
+
+        resp = self.client.get(RecipesTest.url + '?cursor=&limit=2')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        resp_data = resp.json()
+        self.assertEqual(
+            set(resp_data), {'next', 'previous', 'results'})
+        self.assertIsNone(resp_data['previous'])
+
+        seen = [item['id'] for item in resp_data['results']]
+        pages = [resp_data]
+        while resp_data['next']:
+            resp_data = self.client.get(resp_data['next']).json()
+            self.assertLessEqual(len(resp_data['results']), 2)
+            seen += [item['id'] for item in resp_data['results']]
+            pages.append(resp_data)
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+
+        resp_data = self.client.get(pages[-1]['previous']).json()
+        self.assertEqual(resp_data['results'], pages[-2]['results'])
+        resp_data = self.client.get(resp_data['previous']).json()
+        self.assertEqual(resp_data['results'], pages[0]['results'])
+        self.assertIsNone(resp_data['previous'])
+
+        resp = self.client.get(RecipesTest.url + '?cursor=broken')
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        for position in (['a', 'x'], [None, None], ['a', [1]], ['a']):
+            with self.subTest(position=position):
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps({'p': position}).encode()
+                ).decode()
+                resp = self.client.get(RecipesTest.url + f'?cursor={cursor}')
+                self.assertEqual(
+                    resp.status_code, status.HTTP_404_NOT_FOUND
+                )
+
+        resp = self.client.get(RecipesTest.url + '?limit=2')
+        self.assertEqual(resp.json()['count'], len(expected))
+
+    def test_api_recipes_09_cached_count(self):
+        '''
+        Тестируем кэширование и оценку числа рецептов в списке.
+        '''
+        self.addCleanup(cache.clear)
+        url = RecipesTest.url + '?tags=Tag1'
+        resp = self.client.get(url)
+        self.assertEqual(resp['X-Count-Exact'], 'true')
+        self.assertEqual(resp.json()['count'], 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.json()['count'], 1)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries),
+            'Число рецептов не взято из кэша'
+        )
+
+        recipe = Recipe.objects.create(
+            author=RecipesTest.author, name='Ещё рецепт', text='Текст',
+            cooking_time=5, image=RecipesTest.uploaded
+        )
+        RecipeTag.objects.create(recipe=recipe, tag=RecipesTest.tag1)
+        resp = self.client.get(url)
+        self.assertEqual(resp.json()['count'], 2)
+
+        estimate_path = 'api.counting.estimate_count'
+        with mock.patch(estimate_path, return_value=10 ** 9):
+            resp = self.client.get(RecipesTest.url + '?tags=Tag3')
+        self.assertEqual(resp['X-Count-Exact'], 'false')
+        self.assertEqual(resp.json()['count'], 10 ** 9)
+
+    def test_api_recipes_10_fragment_cache(self):
+        '''
+        Тестируем кэш фрагментов рецептов и его сброс.
+        '''
+        self.addCleanup(cache.clear)
+        recipe: Recipe = RecipesTest.recipe
+        url = RecipesTest.url + f'{recipe.id}/'
+        resp = self.auth_client1.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.auth_client1.get(url)
+        self.assertFalse(
+            any('recipeingredientamount' in query['sql'].lower()
+                for query in queries),
+            'Рецепт собран не из кэша'
+        )
+        resp_data = resp.json()
+        self.assertFalse(resp_data['is_favorited'])
+        self.assertTrue(resp_data['is_in_shopping_cart'])
+        self.assertTrue(resp_data['image'].startswith('http://testserver/'))
+
+        resp_data = self.auth_client2.get(url).json()
+        self.assertTrue(resp_data['is_favorited'])
+        self.assertFalse(resp_data['is_in_shopping_cart'])
+
+        recipe.name = 'Новое название'
+        recipe.save()
+        self.assertEqual(
+            self.client.get(url).json()['name'], 'Новое название')
+
+        RecipesTest.tag1.name = 'Новый тег'
+        RecipesTest.tag1.save()
+        tags = self.client.get(url).json()['tags']
+        self.assertIn('Новый тег', [tag['name'] for tag in tags])
+
+        RecipeIngredientAmount.objects.filter(
+            pk=RecipesTest.recipe_ingredient_amount3.pk).delete()
+        resp_data = self.client.get(RecipesTest.url).json()['results'][0]
+        self.assertEqual(len(resp_data['ingredients']), 2)
+
+        RecipesTest.author.first_name = 'Автор'
+        RecipesTest.author.save()
+        resp_data = self.client.get(url).json()
+        self.assertEqual(resp_data['author']['first_name'], 'Автор')
+
+    def test_api_recipes_11_conditional_get(self):
+        '''
+        Тестируем ответ 304 с учётом пользователя в ETag.
+        '''
+        url = RecipesTest.url + f'{RecipesTest.recipe.id}/'
+        resp = self.auth_client1.get(url)
+        etag = resp['ETag']
+        self.assertIn('Authorization', resp['Vary'])
+
+        resp = self.auth_client1.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        resp = self.auth_client2.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        UserFavoriteRecipe.objects.create(
+            user=RecipesTest.user1, recipe=RecipesTest.recipe)
+        resp = self.auth_client1.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.json()['is_favorited'])
+
+    def test_api_recipes_12_filter_tags(self):
+        '''
+        Тестируем фильтр по нескольким тегам.
+        '''
+        self.addCleanup(cache.clear)
+        url = RecipesTest.url + '?tags=Tag1&tags=Tag2&tags=Tag3'
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()['count'], 1)
+        self.assertEqual(len(resp.json()['results']), 1)
+        self.assertFalse(
+            any('FROM "tags_tag"' in query['sql'] for query in queries),
+            'Слаги тегов проверяются запросом к базе'
+        )
+
+        resp = self.client.get(RecipesTest.url + '?tags=Tag3')
+        self.assertEqual(resp.json()['count'], 0)
+
+        resp = self.client.get(RecipesTest.url + '?tags=unknown')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', resp.json())
+
+        Tag.objects.create(name='Tag4', slug='Tag4', color='#111114')
+        resp = self.client.get(RecipesTest.url + '?tags=Tag4')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()['count'], 0)
+
+    def test_api_recipes_13_search(self):
+        '''
+        Тестируем поиск рецептов по названию и описанию.
+        '''
+        self.addCleanup(cache.clear)
+        in_text = Recipe.objects.create(
+            author=RecipesTest.author, name='Суп', text='Тест на бульоне',
+            cooking_time=5, image=RecipesTest.uploaded
+        )
+        RecipeTag.objects.create(recipe=in_text, tag=RecipesTest.tag3)
+        Recipe.objects.create(
+            author=RecipesTest.author, name='Каша', text='Крупа',
+            cooking_time=5, image=RecipesTest.uploaded
+        )
+
+        resp = self.client.get(RecipesTest.url + '?search=Тест')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in resp.json()['results']]
+        self.assertEqual(ids, [RecipesTest.recipe.id, in_text.id])
+
+        resp = self.client.get(RecipesTest.url + '?search=Тест&tags=Tag3')
+        ids = [item['id'] for item in resp.json()['results']]
+        self.assertEqual(ids, [in_text.id])
+
+        resp = self.client.get(RecipesTest.url + '?search=Тест бульон')
+        ids = [item['id'] for item in resp.json()['results']]
+        self.assertEqual(ids, [in_text.id])
+
+        resp = self.auth_client1.get(
+            RecipesTest.url + '?search=Тест&is_in_shopping_cart=1')
+        ids = [item['id'] for item in resp.json()['results']]
+        self.assertEqual(ids, [RecipesTest.recipe.id])
+
+    def test_api_recipes_14_values_read_path(self):
+        '''
+        Тестируем сборку рецептов из .values(): ответ совпадает
+        с ResipeSerializer.
+        '''
+        bare = Recipe.objects.create(
+            author=RecipesTest.user1, name='Без тегов', text='Текст',
+            cooking_time=3, image=RecipesTest.uploaded
+        )
+        ids = [RecipesTest.recipe.id, bare.id]
+        built = RecipeValuesBuilder().build(ids)
+        for recipe in Recipe.objects.filter(pk__in=ids):
+            with self.subTest(recipe=recipe.id):
+                self.assertEqual(
+                    built[recipe.id],
+                    ResipeSerializer(recipe, context={}).data
+                )
+
+        urls = (
+            RecipesTest.url,
+            RecipesTest.url + f'{RecipesTest.recipe.id}/',
+        )
+        for url in urls:
+            for client in (self.client, self.auth_client1, self.auth_client2):
+                with self.subTest(url=url):
+                    with mock.patch.dict(PROJECT_SETTINGS, {
+                        'recipe_fragment_cache': False,
+                        'recipe_values_read': True,
+                    }):
+                        fast = client.get(url)
+                    with mock.patch.dict(PROJECT_SETTINGS, {
+                        'recipe_fragment_cache': False,
+                        'recipe_values_read': False,
+                    }):
+                        default = client.get(url)
+                    self.assertEqual(fast.content, default.content)
+
+    def test_api_recipes_15_query_budgets(self):
+        '''
+        Тестируем бюджет запросов к базе для одного рецепта.
+        '''
+        url = RecipesTest.url + f'{RecipesTest.recipe.id}/'
+        for client in (self.client, self.auth_client1):
+            with self.subTest(client=client):
+                with self.assertQueryBudget('recipes-detail'):
+                    resp = client.get(url)
+                self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_api_recipes_16_create_constant_queries(self):
+        '''
+        Тестируем, что число запросов при создании рецепта
+        не зависит от числа тегов и ингредиентов.
+        '''
+        self.addCleanup(cache.clear)
+        tag_registry.known_ids()
+        ingredients = (
+            RecipesTest.ingredient1, RecipesTest.ingredient2,
+            RecipesTest.ingredient3,
+        )
+        tags = (RecipesTest.tag1, RecipesTest.tag2, RecipesTest.tag3)
+        counts = []
+        for size in (1, 3):
+            recipe_data = {
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': number}
+                    for number, ingredient in enumerate(
+                        ingredients[:size], start=1)
+                ],
+                'tags': [tag.id for tag in tags[:size]],
+                'image': RecipesTest.small_gif_base64,
+                'name': f'Рецепт {size}',
+                'text': 'Текст',
+                'cooking_time': 5,
+            }
+            with self.assertQueryBudget('recipes-create') as queries:
+                resp = self.author_client.post(
+                    RecipesTest.url, data=recipe_data, format='json')
+            counts.append(len(queries))
+            self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(resp.json()['ingredients']), size)
+            self.assertEqual(len(resp.json()['tags']), size)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_api_recipes_17_update_writes_difference(self):
+        '''
+        Тестируем, что изменение рецепта записывает только разницу
+        в тегах и ингредиентах.
+        '''
+        self.addCleanup(cache.clear)
+        recipe: Recipe = RecipesTest.recipe
+        url = RecipesTest.url + f'{recipe.id}/'
+        self.author_client.get(url)
+        recipe_data = {
+            'ingredients': [
+                {'id': RecipesTest.ingredient1.id, 'amount': 1},
+                {'id': RecipesTest.ingredient2.id, 'amount': 2},
+                {'id': RecipesTest.ingredient3.id, 'amount': 5},
+            ],
+            'tags': [RecipesTest.tag1.id, RecipesTest.tag2.id],
+            'name': 'Новое название',
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+
+        def writes(queries, table):
+            return [
+                query['sql'] for query in queries
+                if table in query['sql']
+                and query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            ]
+
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.author_client.patch(
+                url, data=recipe_data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()['name'], 'Новое название')
+        self.assertEqual(writes(queries, 'recipes_recipetag'), [])
+        self.assertEqual(
+            writes(queries, 'recipes_recipeingredientamount'), []
+        )
+
+        ingredient4 = Ingredient.objects.create(
+            name='ingredient4', measurement_unit=RecipesTest.m_u)
+        recipe_data['ingredients'] = [
+            {'id': RecipesTest.ingredient1.id, 'amount': 10},
+            {'id': RecipesTest.ingredient2.id, 'amount': 2},
+            {'id': ingredient4.id, 'amount': 4},
+        ]
+        recipe_data['tags'] = [RecipesTest.tag1.id, RecipesTest.tag3.id]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.author_client.patch(
+                url, data=recipe_data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(writes(queries, 'recipes_recipetag')), 2)
+        self.assertEqual(
+            len(writes(queries, 'recipes_recipeingredientamount')), 3
+        )
+        self.assertTrue(RecipeIngredientAmount.objects.filter(
+            pk=RecipesTest.recipe_ingredient_amount1.pk, amount=10
+        ).exists())
+
+        expected = {
+            RecipesTest.ingredient1.id: 10,
+            RecipesTest.ingredient2.id: 2,
+            ingredient4.id: 4,
+        }
+        for resp_data in (resp.json(), self.client.get(url).json()):
+            self.assertEqual(
+                {item['id']: item['amount']
+                 for item in resp_data['ingredients']},
+                expected,
+            )
+            self.assertEqual(
+                {tag['id'] for tag in resp_data['tags']},
+                {RecipesTest.tag1.id, RecipesTest.tag3.id},
+            )
+
+    def test_api_recipes_18_unknown_ids_reported_together(self):
+        '''
+        Тестируем, что все неизвестные id ингредиентов и тегов
+        возвращаются в одном ответе, а повторы проверяются до поиска.
+        '''
+        recipe_data = {
+            'ingredients': [
+                {'id': RecipesTest.ingredient1.id, 'amount': 1},
+                {'id': 10000, 'amount': 1},
+                {'id': 10001, 'amount': 1},
+            ],
+            'tags': [RecipesTest.tag1.id, 500, 501],
+            'image': RecipesTest.small_gif_base64,
+            'name': 'ТестРецепт1',
+            'text': 'Текст ТестРецепта',
+            'cooking_time': 5
+        }
+        resp = self.author_client.post(
+            RecipesTest.url, data=recipe_data, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = resp.json()
+        self.assertEqual(len(errors['ingredients']), 2)
+        self.assertIn('10001', errors['ingredients'][1])
+        self.assertEqual(len(errors['tags']), 2)
+        self.assertIn('500', errors['tags'][0])
+
+        recipe_data['ingredients'] = [
+            {'id': 10000, 'amount': 1}, {'id': 10000, 'amount': 2},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.author_client.post(
+                RecipesTest.url, data=recipe_data, format='json')
+        self.assertEqual(
+            resp.json()['ingredients'], ['Ingredients should not be repeated!']
+        )
+        self.assertFalse(any(
+            'ingredients_ingredient' in query['sql'] for query in queries
+        ))
+
+    def test_api_recipes_19_fragment_built_during_write(self):
+        '''
+        Тестируем, что фрагмент, собранный во время записи
+        в рецепты, не попадает в кэш.
+        '''
+        self.addCleanup(cache.clear)
+        recipe: Recipe = RecipesTest.recipe
+        renderer = RecipeFragmentRenderer({})
+
+        def build_during_write(recipe_ids):
+            try:
+                return serialize_fragments(
+                    Recipe.objects.filter(pk__in=recipe_ids)
+                )
+            finally:
+                bump_versions(Recipe)
+
+        renderer.render((recipe,), build_during_write)
+        self.assertEqual(get_fragments((recipe.pk,)), {})
+        renderer.render((recipe,), lambda recipe_ids: serialize_fragments(
+            Recipe.objects.filter(pk__in=recipe_ids)
+        ))
+        self.assertIn(recipe.pk, get_fragments((recipe.pk,)))
@@ -0,0 +1,104 @@
+import datetime
+import decimal
+import uuid
+from io import BytesIO
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.management.commands.benchmark_json import (
+    ingredient_list, recipe_page,
+)
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+
+
+class RenderersTests(SimpleTestCase):
+    '''
+    Тестируем совпадение FastJSONRenderer и FastJSONParser
+    со стандартными JSONRenderer и JSONParser.
+    '''
+    payloads = (
+        recipe_page(5),
+        ingredient_list(20),
+        {
+            'text': 'строка с разделителями "и" \\ кавычками',
+            'emoji': '\U0001F35D',
+            'numbers': [0, -1, 2 ** 63 - 1, 2 ** 70, True, None],
+            'error': [ErrorDetail('Обязательное поле.', code='required')],
+            'lazy': gettext_lazy('Учетные данные не были предоставлены.'),
+            'created': datetime.datetime(
+                2022, 5, 26, 17, 9, 1, 123456, tzinfo=datetime.timezone.utc
+            ),
+            'date': datetime.date(2022, 5, 26),
+            'time': datetime.time(17, 9, 1, 500),
+            'duration': datetime.timedelta(minutes=40),
+            'amount': decimal.Decimal('1.5'),
+            'uuid': uuid.UUID('12345678123456781234567812345678'),
+            1: 'int key',
+            'tuple': (1, 2),
+        },
+        [],
+        {},
+        'string',
+    )
+
+    def test_api_renderers_01_same_bytes(self):
+        '''
+        Проверяем, что FastJSONRenderer выдаёт те же байты.
+        '''
+        for payload in RenderersTests.payloads:
+            with self.subTest(payload=type(payload)):
+                self.assertEqual(
+                    FastJSONRenderer().render(payload),
+                    JSONRenderer().render(payload),
+                )
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        self.assertEqual(
+            FastJSONRenderer().render(
+                {'a': [1]}, 'application/json; indent=4'),
+            JSONRenderer().render({'a': [1]}, 'application/json; indent=4'),
+        )
+
+    def test_api_renderers_02_fallback_without_orjson(self):
+        '''
+        Проверяем работу без установленного orjson.
+        '''
+        payload = RenderersTests.payloads[0]
+        with mock.patch('api.renderers.orjson', None):
+            rendered = FastJSONRenderer().render(payload)
+        with mock.patch('api.parsers.orjson', None):
+            parsed = FastJSONParser().parse(BytesIO(rendered))
+        self.assertEqual(rendered, JSONRenderer().render(payload))
+        self.assertEqual(parsed, JSONParser().parse(BytesIO(rendered)))
+
+    def test_api_renderers_03_parser(self):
+        '''
+        Проверяем, что FastJSONParser разбирает тело так же,
+        как JSONParser, и так же сообщает об ошибках.
+        '''
+        bodies = [
+            JSONRenderer().render(payload)
+            for payload in RenderersTests.payloads
+        ]
+        bodies.append('{"name": "\\ud800", "n": 1e400}'.encode())
+        for body in bodies:
+            with self.subTest(body=body[:40]):
+                self.assertEqual(
+                    FastJSONParser().parse(BytesIO(body)),
+                    JSONParser().parse(BytesIO(body)),
+                )
+        for body in (b'{"a": NaN}', b'{"a": 1,}', b'', b'\xff'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as fast:
+                    FastJSONParser().parse(BytesIO(body))
+                with self.assertRaises(ParseError) as default:
+                    JSONParser().parse(BytesIO(body))
+                self.assertEqual(
+                    str(fast.exception.detail),
+                    str(default.exception.detail),
+                )
@@ -14,6 +14,8 @@ from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient, APITestCase, override_settings
 from tags.models import Tag
 
+from api.tests.budgets import QueryBudget, QueryBudgetMixin
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
@@ -26,10 +28,15 @@ def add_num_to_value(d: dict, value: int):
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class ShoppingTest(APITestCase):
+class ShoppingTest(QueryBudgetMixin, APITestCase):
     '''
     Тестируем модель /api/recipes/{id}/shopping_cart/.
     '''
+    query_budgets = {
+        'recipes-shopping-cart': QueryBudget(6, 0),
+        'recipes-download-shopping-cart': QueryBudget(2, 0),
+    }
+
     @classmethod
     def setUpClass(cls):
         '''
@@ -242,3 +249,25 @@ class ShoppingTest(APITestCase):
         url = '/api/recipes/download_shopping_cart/'
         resp = self.auth_client2.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_api_recipes_shopping_query_budget(self):
+        '''
+        Тестируем бюджет запросов списка покупок: скачивание
+        не зависит от числа рецептов в нём.
+        '''
+        url = f'/api/recipes/{ShoppingTest.recipe.id}/shopping_cart/'
+        with self.assertQueryBudget('recipes-shopping-cart'):
+            resp = self.auth_client1.post(url)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        self.assertConstantQueries(
+            'recipes-download-shopping-cart',
+            lambda: self.auth_client1.get(
+                '/api/recipes/download_shopping_cart/'),
+            lambda: self.auth_client1.post(
+                f'/api/recipes/{ShoppingTest.recipe2.id}/shopping_cart/'),
+        )
+
+        with self.assertQueryBudget('recipes-shopping-cart'):
+            resp = self.auth_client1.delete(url)
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
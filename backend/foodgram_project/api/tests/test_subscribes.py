@@ -13,6 +13,8 @@ from rest_framework.test import APIClient, APITestCase, override_settings
 from tags.models import Tag
 from users.models import SubscribeUser
 
+from api.tests.budgets import QueryBudget, QueryBudgetMixin
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
@@ -25,10 +27,15 @@ def add_num_to_value(d: dict, value: int):
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class SubscribesTest(APITestCase):
+class SubscribesTest(QueryBudgetMixin, APITestCase):
     '''
     Тестируем модель /api/users/{id}/subscribe/.
     '''
+    query_budgets = {
+        'users-subscriptions': QueryBudget(5, 0),
+        'users-subscribe': QueryBudget(8, 0),
+    }
+
     @classmethod
     def setUpClass(cls):
         '''
@@ -217,3 +224,41 @@ class SubscribesTest(APITestCase):
         resp = self.auth_client1.delete(url)
         self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(SubscribeUser.objects.count(), count_subscrybe - 1)
+
+    def test_api_subscriptions_query_budgets(self):
+        '''
+        Тестируем, что число запросов к подпискам не зависит
+        от числа авторов и их рецептов.
+        '''
+        url = '/api/users/subscriptions/?recipes_limit=2'
+        author = SubscribesTest.author
+        with self.assertQueryBudget('users-subscribe'):
+            resp = self.auth_client1.post(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        def add_authors():
+            for num in range(4, 7):
+                new_author = User.objects.create_user(
+                    **(add_num_to_value(SubscribesTest.USER_DATA, num)))
+                for name in ('Б', 'А', 'В'):
+                    Recipe.objects.create(
+                        author=new_author, name=name, text='Текст',
+                        cooking_time=5, image=SubscribesTest.uploaded
+                    )
+                SubscribeUser.objects.create(
+                    user=SubscribesTest.user1, author=new_author)
+
+        self.assertConstantQueries(
+            'users-subscriptions', lambda: self.auth_client1.get(url),
+            add_authors
+        )
+        results = self.auth_client1.get(url).json()['results']
+        self.assertEqual(len(results), 4)
+        for item in results:
+            with self.subTest(author=item['id']):
+                self.assertEqual(len(item['recipes']), 2)
+                self.assertEqual(item['recipes_count'], 3)
+        self.assertIn(
+            [recipe['name'] for recipe in results[-1]['recipes']],
+            (['А', 'Б'], ['Тест Рецепт', 'Тест Рецепт Другой'])
+        )
@@ -1,7 +1,16 @@
+import gzip
+import json
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 from tags.models import Tag
 
+from api.serializers import TagSerializer
+
 
 class TagsTests(APITestCase):
     '''
@@ -117,3 +126,114 @@ class TagsTests(APITestCase):
                     self.assertEqual(
                         tag_data[field_name], getattr(tag, field_name)
                     )
+
+    def test_api_tags_06_conditional_get(self):
+        '''
+        Проверяем ответ 304 на /api/tags/ по ETag и Last-Modified.
+        '''
+        self.addCleanup(cache.clear)
+        url = '/api/tags/'
+        later = mock.patch('time.time', return_value=time.time() + 1)
+        with later:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        etag = resp['ETag']
+        last_modified = resp['Last-Modified']
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp['ETag'], etag)
+        with later:
+            resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        resp = self.client.get(
+            url + f'{TagsTests.tag1.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        Tag.objects.create(name='Tag_4', slug='Tag_4', color='#111114')
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.json()), 4)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_api_tags_08_last_modified_same_second(self):
+        '''
+        Проверяем, что Last-Modified не отдаётся, пока не закончилась
+        секунда последнего изменения, и что изменение в ту же секунду
+        не даёт ответа 304.
+        '''
+        self.addCleanup(cache.clear)
+        url = '/api/tags/'
+        second = 2000000000
+        with mock.patch('time.time', return_value=second + 0.2):
+            Tag.objects.create(name='Tag_6', slug='Tag_6', color='#111116')
+        with mock.patch('time.time', return_value=second + 0.5):
+            resp = self.client.get(url)
+        self.assertIn('ETag', resp)
+        self.assertNotIn('Last-Modified', resp)
+
+        with mock.patch('time.time', return_value=second + 1):
+            resp = self.client.get(url)
+        self.assertEqual(resp['Last-Modified'], http_date(second + 1))
+        with mock.patch('time.time', return_value=second + 1.4):
+            Tag.objects.create(name='Tag_8', slug='Tag_8', color='#111118')
+        with mock.patch('time.time', return_value=second + 3):
+            resp = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified']
+            )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp['Last-Modified'], http_date(second + 2))
+
+    def test_api_tags_07_prerendered_list(self):
+        '''
+        Проверяем заранее отрендеренный и сжатый список /api/tags/.
+        '''
+        self.addCleanup(cache.clear)
+        url = '/api/tags/'
+        resp = self.client.get(url)
+        with self.assertNumQueries(0):
+            packed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', packed['Vary'])
+        self.assertEqual(gzip.decompress(packed.content), resp.content)
+        self.assertEqual(
+            json.loads(resp.content),
+            TagSerializer(Tag.objects.all(), many=True).data
+        )
+
+        for accept_encoding in ('gzip;q=0', 'identity, *;q=0', 'br'):
+            with self.subTest(accept_encoding=accept_encoding):
+                plain = self.client.get(
+                    url, HTTP_ACCEPT_ENCODING=accept_encoding
+                )
+                self.assertFalse(plain.has_header('Content-Encoding'))
+                self.assertEqual(plain.content, resp.content)
+                self.assertEqual(plain['ETag'], resp['ETag'])
+        for accept_encoding in ('deflate, gzip;q=0.5', '*'):
+            with self.subTest(accept_encoding=accept_encoding):
+                self.assertEqual(self.client.get(
+                    url, HTTP_ACCEPT_ENCODING=accept_encoding
+                )['Content-Encoding'], 'gzip')
+
+        self.assertEqual(packed['ETag'], resp['ETag'][:-1] + '-gzip"')
+        not_modified = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=packed['ETag'],
+        )
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(not_modified['ETag'], packed['ETag'])
+        for etag, accept_encoding in (
+            (packed['ETag'], ''), (resp['ETag'], 'gzip'),
+        ):
+            with self.subTest(etag=etag, accept_encoding=accept_encoding):
+                self.assertEqual(self.client.get(
+                    url, HTTP_ACCEPT_ENCODING=accept_encoding,
+                    HTTP_IF_NONE_MATCH=etag,
+                ).status_code, status.HTTP_200_OK)
+
+        Tag.objects.create(name='Tag_5', slug='Tag_5', color='#111115')
+        resp = self.client.get(url)
+        self.assertEqual(len(resp.json()), 4)
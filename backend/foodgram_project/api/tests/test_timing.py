@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from foodgram_project.settings import PROJECT_SETTINGS
+
+User = get_user_model()
+
+
+class ServerTimingTests(APITestCase):
+    '''
+    Тестируем заголовок Server-Timing, журнал медленных запросов
+    и отладочные данные для сотрудников.
+    '''
+    url = '/api/users/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', password='pass',
+        )
+        cls.staff = User.objects.create_user(
+            username='staff', email='staff@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', password='pass',
+            is_staff=True,
+        )
+
+    def get(self, user=None, **project_settings):
+        settings = {'server_timing': True, 'server_timing_debug': False}
+        settings.update(project_settings)
+        with mock.patch.dict(PROJECT_SETTINGS, settings):
+            client = APIClient()
+            if user is not None:
+                client.force_authenticate(user)
+            return client.get(self.url)
+
+    def test_api_timing_01_header(self):
+        '''
+        Проверяем состав заголовка и его отсутствие без замеров.
+        '''
+        resp = self.get()
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        metrics = {
+            metric.split(';')[0]: metric
+            for metric in resp['Server-Timing'].split(', ')
+        }
+        self.assertEqual(
+            set(metrics), {'db', 'serialize', 'render', 'total'}
+        )
+        self.assertRegex(metrics['db'], r'^db;dur=[\d.]+;desc="\d+ queries"$')
+        self.assertFalse(self.get(server_timing=False).has_header(
+            'Server-Timing'
+        ))
+
+    def test_api_timing_02_slow_requests_logged(self):
+        '''
+        Проверяем, что запросы сверх порогов пишутся в лог.
+        '''
+        with self.assertLogs('api.timing', 'WARNING') as logs:
+            self.get(slow_request_queries=1)
+        self.assertIn('Slow request GET /api/users/', logs.output[0])
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('api.timing', 'WARNING'):
+                self.get(slow_request_ms=10 ** 6, slow_request_queries=10 ** 6)
+
+    def test_api_timing_03_debug_footer(self):
+        '''
+        Проверяем, что отладочные данные видят только сотрудники.
+        '''
+        resp = self.get(self.staff, server_timing_debug=True)
+        debug = resp.json()['debug_timing']
+        self.assertGreater(debug['queries'], 0)
+        self.assertEqual(len(debug['slowest_sql']), debug['queries'])
+        self.assertEqual(len(resp.json()['results']), 2)
+
+        resp = self.get(self.user, server_timing_debug=True)
+        self.assertNotIn('debug_timing', resp.json())
+        resp = self.get(self.staff)
+        self.assertNotIn('debug_timing', resp.json())
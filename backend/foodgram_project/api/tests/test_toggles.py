@@ -0,0 +1,274 @@
+import threading
+from unittest import mock, skipIf
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.models import Recipe, UserFavoriteRecipe, UserShoppingCart
+from users.models import SubscribeUser
+
+from api.tests.budgets import QueryBudget, QueryBudgetMixin
+
+User = get_user_model()
+
+THREADS = 8
+CONCURRENT_WRITES = skipIf(
+    connection.vendor == 'sqlite',
+    'тестовая база SQLite в памяти не допускает одновременной записи',
+)
+
+
+class ConcurrentToggleTest(TransactionTestCase):
+    '''
+    Тестируем одновременные одинаковые запросы к избранному,
+    списку покупок и подпискам.
+    '''
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(
+            username='user', email='user@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', password='pass',
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', password='pass',
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=5, image='recipes/images/recipe.png',
+        )
+
+    def hammer(self, method, url) -> list:
+        '''
+        Отправляет THREADS одинаковых запросов одновременно
+        и возвращает отсортированные коды ответов.
+        '''
+        barrier = threading.Barrier(THREADS)
+        codes = []
+        lock = threading.Lock()
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                code = getattr(client, method)(url).status_code
+            finally:
+                connection.close()
+            with lock:
+                codes.append(code)
+
+        threads = [threading.Thread(target=send) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(codes)
+
+    def check_toggle(self, url, model, counter):
+        '''
+        Одновременно добавляем и одновременно удаляем одну и ту же
+        связь: ровно один запрос удаётся, остальные получают 400,
+        счётчик меняется ровно на единицу.
+        '''
+        codes = self.hammer('post', url)
+        self.assertEqual(
+            codes,
+            [status.HTTP_201_CREATED]
+            + [status.HTTP_400_BAD_REQUEST] * (THREADS - 1),
+        )
+        self.assertEqual(model.objects.count(), 1)
+        self.assertEqual(counter(), 1)
+
+        codes = self.hammer('delete', url)
+        self.assertEqual(
+            codes,
+            [status.HTTP_204_NO_CONTENT]
+            + [status.HTTP_400_BAD_REQUEST] * (THREADS - 1),
+        )
+        self.assertEqual(model.objects.count(), 0)
+        self.assertEqual(counter(), 0)
+
+    @CONCURRENT_WRITES
+    def test_api_toggles_01_concurrent_recipes(self):
+        '''
+        Проверяем избранное и список покупок.
+        '''
+        for suffix, model, field in (
+            ('favorite', UserFavoriteRecipe, 'favorites_count'),
+            ('shopping_cart', UserShoppingCart, 'in_cart_count'),
+        ):
+            with self.subTest(suffix=suffix):
+                self.check_toggle(
+                    f'/api/recipes/{self.recipe.pk}/{suffix}/', model,
+                    lambda field=field: getattr(
+                        Recipe.objects.get(pk=self.recipe.pk), field
+                    ),
+                )
+
+    @CONCURRENT_WRITES
+    def test_api_toggles_02_concurrent_subscribe(self):
+        '''
+        Проверяем подписки.
+        '''
+        self.check_toggle(
+            f'/api/users/{self.author.pk}/subscribe/', SubscribeUser,
+            lambda: User.objects.get(pk=self.author.pk).followers_count,
+        )
+
+    def test_api_toggles_03_unknown_and_invalid_ids(self):
+        '''
+        Проверяем ответы для несуществующих и нечисловых id.
+        '''
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for method in ('post', 'delete'):
+            for pk in (self.recipe.pk + 100, 'abc'):
+                with self.subTest(method=method, pk=pk):
+                    resp = getattr(client, method)(
+                        f'/api/recipes/{pk}/favorite/'
+                    )
+                    self.assertEqual(
+                        resp.status_code, status.HTTP_400_BAD_REQUEST
+                    )
+                    self.assertEqual(
+                        resp.json()['errors'],
+                        f'Recipe with id={pk} does not exists',
+                    )
+                    resp = getattr(client, method)(
+                        f'/api/users/{pk}/subscribe/'
+                    )
+                    self.assertEqual(
+                        resp.status_code, status.HTTP_404_NOT_FOUND
+                    )
+        resp = client.post(f'/api/users/{self.user.pk}/subscribe/')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(SubscribeUser.objects.exists())
+
+
+class BulkToggleTest(QueryBudgetMixin, APITestCase):
+    '''
+    Тестируем массовое добавление рецептов в избранное и список
+    покупок, удаление оттуда и очистку списка покупок.
+    '''
+    query_budgets = {
+        'recipes-toggle-many': QueryBudget(5, 0),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', password='pass',
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {number}', text='Текст',
+                cooking_time=5, image='recipes/images/recipe.png',
+            )
+            for number in range(12)
+        ]
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.client.force_authenticate(self.user)
+
+    def counts(self, field) -> list:
+        return [
+            getattr(recipe, field)
+            for recipe in Recipe.objects.order_by('pk')[:3]
+        ]
+
+    def test_api_toggles_04_add_and_remove_many(self):
+        '''
+        Проверяем исходы по каждому id, повторы и счётчики.
+        '''
+        first, second, third = (recipe.pk for recipe in self.recipes[:3])
+        missing = self.recipes[-1].pk + 100
+        UserShoppingCart.objects.create(user=self.user, recipe_id=second)
+        url = '/api/recipes/shopping_cart/'
+
+        resp = self.client.post(
+            url, {'ids': [first, second, missing, first]}, format='json'
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()['results'], [
+            {'id': first, 'status': 'added'},
+            {'id': second, 'status': 'already_added'},
+            {'id': missing, 'status': 'not_found'},
+        ])
+        self.assertEqual(self.counts('in_cart_count'), [1, 1, 0])
+
+        resp = self.client.delete(
+            url, {'ids': [second, third, missing]}, format='json'
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()['results'], [
+            {'id': second, 'status': 'removed'},
+            {'id': third, 'status': 'not_added'},
+            {'id': missing, 'status': 'not_found'},
+        ])
+        self.assertEqual(self.counts('in_cart_count'), [1, 0, 0])
+        self.assertEqual(
+            list(UserShoppingCart.objects.values_list('recipe', flat=True)),
+            [first],
+        )
+
+        resp = self.client.post(
+            '/api/recipes/favorite/', {'ids': [third]}, format='json'
+        )
+        self.assertEqual(resp.json()['results'], [
+            {'id': third, 'status': 'added'},
+        ])
+        self.assertEqual(self.counts('favorites_count'), [0, 0, 1])
+
+        for data in ({}, {'ids': []}, {'ids': ['a']}, {'ids': [0]}):
+            with self.subTest(data=data):
+                resp = self.client.post(url, data, format='json')
+                self.assertEqual(
+                    resp.status_code, status.HTTP_400_BAD_REQUEST
+                )
+
+    def test_api_toggles_05_clear_cart(self):
+        '''
+        Проверяем очистку списка покупок.
+        '''
+        for recipe in self.recipes[:3]:
+            UserShoppingCart.objects.create(user=self.user, recipe=recipe)
+        resp = self.client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(UserShoppingCart.objects.exists())
+        self.assertEqual(self.counts('in_cart_count'), [0, 0, 0])
+
+        with mock.patch('api.toggles.returning_supported', lambda: False):
+            for recipe in self.recipes[:2]:
+                UserShoppingCart.objects.create(user=self.user, recipe=recipe)
+            resp = self.client.delete('/api/recipes/shopping_cart/clear/')
+            self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+            self.assertEqual(self.counts('in_cart_count'), [0, 0, 0])
+
+            resp = self.client.post(
+                '/api/recipes/shopping_cart/',
+                {'ids': [self.recipes[0].pk]}, format='json',
+            )
+            self.assertEqual(resp.json()['results'][0]['status'], 'added')
+            self.assertEqual(self.counts('in_cart_count'), [1, 0, 0])
+
+    def test_api_toggles_06_query_budget(self):
+        '''
+        Тестируем, что число запросов не зависит от числа id.
+        '''
+        url = '/api/recipes/favorite/'
+        for recipes in (self.recipes[:2], self.recipes):
+            ids = [recipe.pk for recipe in recipes]
+            for method in ('post', 'delete'):
+                with self.subTest(items=len(ids), method=method):
+                    with self.assertQueryBudget('recipes-toggle-many'):
+                        resp = getattr(self.client, method)(
+                            url, {'ids': ids}, format='json'
+                        )
+                    self.assertEqual(resp.status_code, status.HTTP_200_OK)
@@ -4,6 +4,8 @@ from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient, APITestCase
 from users.models import SubscribeUser
 
+from api.tests.budgets import QueryBudget, QueryBudgetMixin
+
 User = get_user_model()
 
 
@@ -14,10 +16,14 @@ def add_num_to_value(d: dict, value: int):
     return res
 
 
-class UsersTests(APITestCase):
+class UsersTests(QueryBudgetMixin, APITestCase):
     '''
     Тестируем /api/users/.
     '''
+    query_budgets = {
+        'users-list': QueryBudget(4, 0),
+    }
+
     @classmethod
     def setUpClass(cls):
         '''
@@ -351,6 +357,35 @@ class UsersTests(APITestCase):
                 self.assertEqual(
                     resp.json().get('is_subscribed'), value)
 
+    def test_api_users_08_list_is_subscribed_batched(self):
+        '''
+        Проверяем, что is_subscribed в списке проверяется одним запросом.
+        '''
+        url = UsersTests.url
+
+        def add_subscriptions():
+            for num in range(4, 9):
+                author = User.objects.create_user(
+                    **(add_num_to_value(UsersTests.USER_DATA, num)))
+                SubscribeUser.objects.create(
+                    user=UsersTests.user2, author=author)
+
+        self.assertConstantQueries(
+            'users-list', lambda: self.auth_client2.get(url),
+            add_subscriptions
+        )
+        resp = self.auth_client2.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        subscribed = {
+            item['id']: item['is_subscribed']
+            for item in resp.json()['results']
+        }
+        self.assertEqual(len(subscribed), 8)
+        self.assertTrue(subscribed[UsersTests.author.id])
+        self.assertFalse(subscribed[UsersTests.user1.id])
+        self.assertEqual(sum(subscribed.values()), 6)
+
     def test_api_users_09_url_test_me(self):
         '''
         Проверяем работу /api/users/me.
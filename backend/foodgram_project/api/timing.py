@@ -0,0 +1,199 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, nullcontext
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from foodgram_project.settings import PROJECT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+NOT_TIMED = nullcontext()
+DEBUG_SQL_LIMIT = 20
+
+
+class RequestTimer:
+    '''
+    Класс RequestTimer.
+
+    Собирает для одного запроса число и время запросов к базе
+    и время именованных участков (сериализация, рендеринг и т.п.).
+    Время участка считается без запросов к базе внутри него.
+    '''
+    def __init__(self, keep_sql=False):
+        self.started = time.perf_counter()
+        self.total = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = defaultdict(float)
+        self.depth = defaultdict(int)
+        self.sql = [] if keep_sql else None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            if self.sql is not None:
+                self.sql.append((duration, sql))
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def header(self) -> str:
+        '''
+        Значение заголовка Server-Timing, длительности в мс.
+        '''
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"'
+        ]
+        metrics.extend(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in self.sections.items()
+        )
+        metrics.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def as_dict(self) -> dict:
+        data = {
+            'total_ms': round(self.total * 1000, 3),
+            'db_ms': round(self.db_time * 1000, 3),
+            'queries': self.queries,
+            'sections_ms': {
+                name: round(duration * 1000, 3)
+                for name, duration in self.sections.items()
+            },
+        }
+        if self.sql is not None:
+            data['slowest_sql'] = [
+                {'ms': round(duration * 1000, 3), 'sql': sql}
+                for duration, sql in sorted(
+                    self.sql, key=lambda item: item[0], reverse=True
+                )[:DEBUG_SQL_LIMIT]
+            ]
+        return data
+
+
+class TimedSection:
+    '''
+    Класс TimedSection.
+
+    Добавляет время блока with к участку name текущего запроса.
+    Вложенные участки с тем же именем учитываются один раз.
+    '''
+    __slots__ = ('timer', 'name', 'started', 'db_started')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer.depth[self.name] += 1
+        self.started = time.perf_counter()
+        self.db_started = self.timer.db_time
+
+    def __exit__(self, *exc_info):
+        timer = self.timer
+        timer.depth[self.name] -= 1
+        if timer.depth[self.name]:
+            return
+        elapsed = time.perf_counter() - self.started
+        timer.sections[self.name] += elapsed - (
+            timer.db_time - self.db_started
+        )
+
+
+def timed(name):
+    '''
+    Контекстный менеджер участка name; без активного замера
+    возвращает пустой менеджер и ничего не считает.
+    '''
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        return NOT_TIMED
+    return TimedSection(timer, name)
+
+
+class ServerTimingMiddleware:
+    '''
+    Класс ServerTimingMiddleware.
+
+    Замеряет запросы к базе и участки обработки запроса и отдаёт их
+    в заголовке Server-Timing. Медленные запросы и запросы
+    с большим числом обращений к базе пишутся в лог. Сотрудникам
+    при включённом server_timing_debug в JSON-объект ответа
+    добавляется ключ debug_timing с самыми долгими SQL-запросами.
+    Если замеры выключены, middleware не подключается вовсе.
+    '''
+    def __init__(self, get_response):
+        if not PROJECT_SETTINGS.get('server_timing'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.debug = bool(PROJECT_SETTINGS.get('server_timing_debug'))
+
+    def __call__(self, request):
+        timer = RequestTimer(keep_sql=self.debug)
+        _local.timer = timer
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timer.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.timer = None
+        timer.finish()
+        response['Server-Timing'] = timer.header()
+        self.log_slow(request, response, timer)
+        if self.debug and self.shows_debug(request, response):
+            self.add_debug_footer(response, timer)
+        return response
+
+    @staticmethod
+    def log_slow(request, response, timer):
+        slow_ms = PROJECT_SETTINGS.get('slow_request_ms')
+        slow_queries = PROJECT_SETTINGS.get('slow_request_queries')
+        if (timer.total * 1000 < slow_ms
+                and timer.queries < slow_queries):
+            return
+        logger.warning(
+            'Slow request %s %s: status %s, %.1f ms, %d queries '
+            '(%.1f ms), sections %s',
+            request.method, request.get_full_path(), response.status_code,
+            timer.total * 1000, timer.queries, timer.db_time * 1000,
+            timer.as_dict()['sections_ms'],
+        )
+
+    @staticmethod
+    def shows_debug(request, response) -> bool:
+        user = getattr(request, 'user', None)
+        return (
+            user is not None and user.is_staff
+            and not response.streaming
+            and not response.has_header('Content-Encoding')
+            and response.get('Content-Type', '').startswith(
+                'application/json'
+            )
+        )
+
+    @staticmethod
+    def add_debug_footer(response, timer):
+        try:
+            data = json.loads(response.content)
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        data['debug_timing'] = timer.as_dict()
+        response.content = json.dumps(data, ensure_ascii=False)
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
@@ -0,0 +1,227 @@
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from recipes.models import UserFavoriteRecipe, UserShoppingCart
+from recipes.signals import COUNTERS as RECIPES_COUNTERS
+from recipes.signals import bulk_changed
+from users.models import SubscribeUser
+from users.signals import COUNTERS as USERS_COUNTERS
+
+ADDED = 'added'
+ALREADY_ADDED = 'already_added'
+REMOVED = 'removed'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+
+
+def parse_pk(value):
+    '''
+    id из адреса запроса или None, если это не целое число.
+    '''
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def returning_supported() -> bool:
+    '''
+    Умеет ли база вернуть затронутые строки из INSERT и DELETE.
+    '''
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def placeholders(count) -> str:
+    return ', '.join(['%s'] * count)
+
+
+class Toggle:
+    '''
+    Класс Toggle.
+
+    Связь пользователя с объектом через модель model с уникальной
+    парой (owner, target): избранное, список покупок, подписки.
+    Добавление - одна команда INSERT ... SELECT, которая ничего
+    не вставляет, если объекта нет или связь уже есть (ON CONFLICT
+    DO NOTHING в PostgreSQL, INSERT OR IGNORE в SQLite). Удаление -
+    одна команда DELETE. Результатом считаются строки, которые
+    вернула база (RETURNING), а без RETURNING - число затронутых
+    строк, поэтому одновременные одинаковые запросы не приводят
+    ни к ошибке уникальности, ни к двойному учёту в счётчике.
+    Сигналы post_save и post_delete при этом не отправляются:
+    счётчики и версии данных обновляются здесь же.
+    '''
+    def __init__(self, model, owner, target):
+        self.model = model
+        self.owner = model._meta.get_field(owner)
+        self.target = model._meta.get_field(target)
+        self.related = self.target.related_model
+        self.counters = [
+            counter
+            for counter in RECIPES_COUNTERS + USERS_COUNTERS
+            if counter.source is model and counter.fk == self.target
+        ]
+
+    def target_exists(self, target_pk) -> bool:
+        return self.related.objects.filter(pk=target_pk).exists()
+
+    def state(self, owner_pk, target_pks) -> dict:
+        '''
+        Для существующих объектов из target_pks - есть ли уже связь.
+        '''
+        linked = self.model.objects.filter(**{
+            self.owner.attname: owner_pk,
+            self.target.attname: OuterRef('pk'),
+        })
+        return dict(
+            self.related.objects.filter(pk__in=target_pks)
+            .annotate(linked=Exists(linked))
+            .values_list('pk', 'linked')
+        )
+
+    def insert_sql(self, count) -> str:
+        ops = connection.ops
+        quote = ops.quote_name
+        related_pk = quote(self.related._meta.pk.column)
+        return (
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{quote(self.model._meta.db_table)} '
+            f'({quote(self.owner.column)}, {quote(self.target.column)}) '
+            f'SELECT %s, {related_pk} '
+            f'FROM {quote(self.related._meta.db_table)} '
+            f'WHERE {related_pk} IN ({placeholders(count)}) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        )
+
+    def delete_sql(self, count=None) -> str:
+        '''
+        DELETE связей владельца с count объектами или со всеми.
+        '''
+        quote = connection.ops.quote_name
+        sql = (
+            f'DELETE FROM {quote(self.model._meta.db_table)} '
+            f'WHERE {quote(self.owner.column)} = %s'
+        )
+        if count is None:
+            return sql
+        return (
+            f'{sql} AND {quote(self.target.column)} '
+            f'IN ({placeholders(count)})'
+        )
+
+    def execute(self, sql, params, target_pks, delta) -> set:
+        '''
+        Выполняет команду записи и возвращает id объектов, связь
+        с которыми изменилась. Если база не вернула строк и изменилась
+        только часть target_pks, изменившимися считаются все,
+        а счётчики пересчитываются.
+        '''
+        returning = returning_supported()
+        if returning:
+            column = connection.ops.quote_name(self.target.column)
+            sql = f'{sql} RETURNING {column}'
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                if returning:
+                    changed = {row[0] for row in cursor.fetchall()}
+                    exact = True
+                else:
+                    changed = set(target_pks) if cursor.rowcount else set()
+                    exact = cursor.rowcount == len(changed)
+            if changed:
+                for counter in self.counters:
+                    if exact:
+                        counter.change_many(changed, delta)
+                    else:
+                        counter.recompute(changed)
+                bulk_changed.send(sender=self.model, recipe_ids=())
+        return changed
+
+    def add(self, owner_pk, target_pk) -> bool:
+        '''
+        Добавляет связь; True, если строка вставлена.
+        '''
+        return bool(self.execute(
+            self.insert_sql(1), (owner_pk, target_pk), (target_pk,), 1
+        ))
+
+    def remove(self, owner_pk, target_pk) -> bool:
+        '''
+        Удаляет связь; True, если строка была.
+        '''
+        return bool(self.execute(
+            self.delete_sql(1), (owner_pk, target_pk), (target_pk,), -1
+        ))
+
+    def add_many(self, owner_pk, target_pks) -> dict:
+        '''
+        Добавляет связи с объектами target_pks: одно чтение состояния
+        и одна вставка. Возвращает исход для каждого id.
+        '''
+        state = self.state(owner_pk, target_pks)
+        candidates = [pk for pk, linked in state.items() if not linked]
+        added = set()
+        if candidates:
+            added = self.execute(
+                self.insert_sql(len(candidates)),
+                [owner_pk, *candidates], candidates, 1,
+            )
+        return {
+            pk: (
+                ADDED if pk in added
+                else ALREADY_ADDED if pk in state
+                else NOT_FOUND
+            )
+            for pk in target_pks
+        }
+
+    def remove_many(self, owner_pk, target_pks) -> dict:
+        '''
+        Удаляет связи с объектами target_pks: одно чтение состояния
+        и одно удаление. Возвращает исход для каждого id.
+        '''
+        state = self.state(owner_pk, target_pks)
+        candidates = [pk for pk, linked in state.items() if linked]
+        removed = set()
+        if candidates:
+            removed = self.execute(
+                self.delete_sql(len(candidates)),
+                [owner_pk, *candidates], candidates, -1,
+            )
+        return {
+            pk: (
+                REMOVED if pk in removed
+                else NOT_ADDED if pk in state
+                else NOT_FOUND
+            )
+            for pk in target_pks
+        }
+
+    def clear(self, owner_pk) -> set:
+        '''
+        Удаляет все связи владельца; возвращает id объектов.
+        '''
+        if returning_supported():
+            return self.execute(self.delete_sql(), (owner_pk,), (), -1)
+        with transaction.atomic():
+            target_pks = list(
+                self.model.objects.filter(**{self.owner.attname: owner_pk})
+                .values_list(self.target.attname, flat=True)
+            )
+            if not target_pks:
+                return set()
+            return self.execute(
+                self.delete_sql(len(target_pks)),
+                [owner_pk, *target_pks], target_pks, -1,
+            )
+
+
+FAVORITES = Toggle(UserFavoriteRecipe, 'user', 'recipe')
+SHOPPING_CART = Toggle(UserShoppingCart, 'user', 'recipe')
+SUBSCRIPTIONS = Toggle(SubscribeUser, 'user', 'author')
@@ -2,7 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from api.views import (IngredientViewSet, RecipeViewSet, TagViewSet,
-                       UserViewSet, drop_token, get_token)
+                       UserViewSet, drop_token, get_metrics, get_token)
 
 app_name = 'api'
 
@@ -17,4 +17,5 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/token/login/', get_token, name='GetToken'),
     path('auth/token/logout/', drop_token, name='DropToken'),
+    path('metrics/', get_metrics, name='Metrics'),
 ]
@@ -0,0 +1,62 @@
+import time
+
+from django.core.cache import cache
+
+
+def version_key(model) -> str:
+    return f'model-version:{model._meta.label_lower}'
+
+
+def modified_key(model) -> str:
+    return f'model-modified:{model._meta.label_lower}'
+
+
+def get_versions(*models) -> tuple:
+    '''
+    Возвращает счётчики изменений для переданных моделей.
+    '''
+    keys = [version_key(model) for model in models]
+    values = cache.get_many(keys)
+    result = []
+    for key in keys:
+        value = values.get(key)
+        if value is None:
+            value = _seed(key)
+        result.append(value)
+    return tuple(result)
+
+
+def get_last_modified(*models):
+    '''
+    Время последнего изменения моделей (unix time) или None,
+    если для какой-то из них оно неизвестно.
+    '''
+    keys = [modified_key(model) for model in models]
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        return None
+    return max(values.values())
+
+
+def bump_versions(*models):
+    '''
+    Увеличивает счётчики изменений моделей
+    и запоминает время изменения.
+    '''
+    for model in models:
+        key = version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            _seed(key)
+    now = time.time()
+    cache.set_many({modified_key(model): now for model in models}, None)
+
+
+def _seed(key) -> int:
+    '''
+    Счётчик, потерянный кэшем, начинается с текущего времени в мс,
+    чтобы не совпасть ни с одним из ранее выданных значений.
+    '''
+    cache.add(key, int(time.time() * 1000), timeout=None)
+    return cache.get(key)
@@ -2,6 +2,7 @@ from csv import writer
 
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch, Subquery
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
@@ -10,18 +11,27 @@ from rest_framework import decorators, mixins, permissions, status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 
+from api.builders import RecipeValuesBuilder, values_read_enabled
+from api.catalogue import ingredient_index, ingredient_index_enabled
+from api.conditional import ConditionalGetMixin
 from api.filters import IngredientFilter, RecipeFilter
+from api.fragments import (RecipeFragmentRenderer, fragments_enabled,
+                           serialize_fragments)
+from api.metrics import METRICS_CONTENT_TYPE, metrics_text
 from api.paginators import PageNumberCustomPaginator
-from api.permissions import AuthorOrReadOnly
+from api.permissions import AuthorOrReadOnly, InternalCallerOnly
+from api.prerendered import PrerenderedBody, PrerenderedListMixin
 from api.serializers import (GetTokenSerializer, IngredientSerializer,
-                             ResipeEditSerializer, ResipeSerializer,
-                             ResipeShortSerializer, TagSerializer,
+                             RecipeIdsSerializer, ResipeEditSerializer,
+                             ResipeSerializer, ResipeShortSerializer,
+                             TagSerializer,
                              UserChangePasswordSerializer,
                              UserCreateSerializer, UserSerializer,
-                             UserSubscribeSerializer)
-from ingredients.models import Ingredient
-from recipes.models import (Recipe, RecipeIngredientAmount, UserFavoriteRecipe,
-                            UserShoppingCart)
+                             UserSubscribeSerializer, get_recipes_limit)
+from api.toggles import FAVORITES, SHOPPING_CART, SUBSCRIPTIONS, parse_pk
+from ingredients.models import Ingredient, MeasurementUnit
+from recipes.models import (Recipe, RecipeIngredientAmount, RecipeTag,
+                            UserFavoriteRecipe, UserShoppingCart)
 from tags.models import Tag
 from users.models import SubscribeUser
 
@@ -57,23 +67,82 @@ def drop_token(request):
     )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+@decorators.api_view(('GET',))
+@decorators.authentication_classes(())
+@decorators.permission_classes((InternalCallerOnly,))
+def get_metrics(request):
+    return HttpResponse(metrics_text(), content_type=METRICS_CONTENT_TYPE)
+
+
+class IngredientViewSet(
+    PrerenderedListMixin,
+    ConditionalGetMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     '''
     Класс IngredientViewSet для модели Ingredient.
     '''
-    queryset = Ingredient.objects.all()
+    conditional_models = (Ingredient, MeasurementUnit)
+    prerendered_body = PrerenderedBody()
+    queryset = Ingredient.objects.select_related('measurement_unit')
     serializer_class = IngredientSerializer
     filter_backends = (
         DjangoFilterBackend,
     )
     filterset_class = IngredientFilter
     pagination_class = None
+    limit_query_param = 'limit'
 
+    def get_limit(self):
+        '''
+        Возвращает ограничение числа подсказок из параметра limit.
+        '''
+        try:
+            limit = int(self.request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return None
+        return limit if limit > 0 else None
+
+    def get_prerendered_data(self):
+        if ingredient_index_enabled():
+            return ingredient_index.search('')
+        return super().get_prerendered_data()
+
+    def list(self, request, *args, **kwargs):
+        '''
+        Полный список отдаётся заранее отрендеренным, поиск по названию
+        обслуживается индексом в памяти, база используется, пока
+        индекс не готов.
+        '''
+        response = self.get_prerendered_response(request)
+        if response is not None:
+            return response
+        name = request.query_params.get('name', '')
+        limit = self.get_limit()
+        if (name or limit) and ingredient_index_enabled():
+            if request.query_params.get('fuzzy') == '1':
+                found = ingredient_index.fuzzy(name, limit)
+            else:
+                found = ingredient_index.search(name, limit)
+            if found is not None:
+                return Response(found)
+        queryset = self.filter_queryset(self.get_queryset())
+        if limit:
+            queryset = queryset[:limit]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(
+    PrerenderedListMixin,
+    ConditionalGetMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
     '''
     Класс TagViewSet для модели Tag.
     '''
+    conditional_models = (Tag,)
+    prerendered_body = PrerenderedBody()
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
@@ -91,6 +160,7 @@ class UserViewSet(
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = PageNumberCustomPaginator
+    cursor_ordering = ('username', 'id')
 
     def create(self, request, *args, **kwargs):
         serializer = UserCreateSerializer(data=request.data)
@@ -112,7 +182,7 @@ class UserViewSet(
     )
     def me(self, request, *args, **kwargs):
         user = request.user
-        serializer = UserSerializer(user)
+        serializer = UserSerializer(user, context={'request': request})
         return Response(serializer.data)
 
     @decorators.action(
@@ -146,49 +216,57 @@ class UserViewSet(
         '''
         user = request.user
         author_id = kwargs.get('pk', 0)
+        pk = parse_pk(author_id)
 
-        if not User.objects.filter(id=author_id).exists():
-            text = f'Author with id={author_id} does not exists'
-            return Response(
-                {'errors': text},
-                status=status.HTTP_404_NOT_FOUND,
-            )
-
-        author = User.objects.get(id=author_id)
-        params = {
-            'author': author,
-            'user': user,
-        }
-
-        if request.method == 'POST':
-            if author == user:
-                return Response(
-                    {'errors': 'can not subscribe to yourself'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            obj, created = SubscribeUser.objects.get_or_create(**params)
-            if created:
-                serializer = UserSubscribeSerializer(
-                    instance=author, context={'request': request})
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
+        if request.method == 'POST' and pk == user.pk:
             return Response(
-                {'errors': 'The recipe is already add'},
+                {'errors': 'can not subscribe to yourself'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        if request.method == 'POST':
+            done = pk is not None and SUBSCRIPTIONS.add(user.pk, pk)
+        else:
+            done = pk is not None and SUBSCRIPTIONS.remove(user.pk, pk)
 
-        if SubscribeUser.objects.filter(**params).exists():
-            obj = SubscribeUser.objects.get(**params)
-            obj.delete()
+        if done and request.method == 'POST':
+            serializer = UserSubscribeSerializer(
+                instance=User.objects.get(pk=pk),
+                context={'request': request},
+            )
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if done:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+        if pk is None or not SUBSCRIPTIONS.target_exists(pk):
+            text = f'Author with id={author_id} does not exists'
+            return Response(
+                {'errors': text},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if request.method == 'POST':
+            text = 'The recipe is already add'
+        else:
+            text = 'The author is not add'
         return Response(
-            {'errors': 'The author is not add'},
+            {'errors': text},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @staticmethod
+    def subscription_recipes(recipes_limit):
+        '''
+        Рецепты авторов страницы подписок одним запросом:
+        не больше recipes_limit первых по названию рецептов на автора.
+        '''
+        recipes = Recipe.objects.defer('search_vector').order_by('name', 'id')
+        if recipes_limit is None:
+            return recipes
+        return recipes.filter(pk__in=Subquery(
+            Recipe.objects.filter(author=OuterRef('author')).order_by(
+                'name', 'id'
+            ).values('pk')[:recipes_limit]
+        ))
+
     @decorators.action(
         methods=('get',),
         permission_classes=(permissions.IsAuthenticated,),
@@ -198,7 +276,12 @@ class UserViewSet(
     )
     def subscriptions(self, request, *args, **kwargs):
         user = request.user
-        queryset = User.objects.filter(subscribe__user=user)
+        queryset = User.objects.filter(subscribe__user=user).prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=self.subscription_recipes(get_recipes_limit(request)),
+            )
+        )
 
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -211,10 +294,16 @@ class UserViewSet(
         return Response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     '''
     Класс RecipeViewSet для модели Recipes.
     '''
+    conditional_models = (
+        Recipe, RecipeTag, RecipeIngredientAmount,
+        Tag, Ingredient, MeasurementUnit, User,
+        UserFavoriteRecipe, UserShoppingCart, SubscribeUser,
+    )
+    conditional_per_user = True
     queryset = Recipe.objects.all()
     serializer_class = ResipeSerializer
     permission_classes = (AuthorOrReadOnly,)
@@ -223,6 +312,94 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     filterset_class = RecipeFilter
     pagination_class = PageNumberCustomPaginator
+    cursor_ordering = ('name', 'id')
+
+    def get_queryset(self):
+        '''
+        Для list и retrieve собирает queryset, который отдаёт страницу
+        рецептов за постоянное число запросов независимо от её размера.
+        Если представление собирается из фрагментов, связанные данные
+        не подгружаются: они нужны только для рецептов, которых нет
+        в кэше, и читаются отдельно.
+        '''
+        if self.action not in ('list', 'retrieve'):
+            return super().get_queryset()
+
+        queryset = Recipe.objects.defer('search_vector')
+        if not self.uses_fragments():
+            queryset = self.plan_queryset(queryset)
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited_flag=Exists(
+                UserFavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart_flag=Exists(
+                UserShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )
+            ),
+            author_is_subscribed_flag=Exists(
+                SubscribeUser.objects.filter(
+                    user=user, author=OuterRef('author')
+                )
+            ),
+        )
+
+    @staticmethod
+    def plan_queryset(queryset):
+        '''
+        Подгружает автора, теги и ингредиенты рецептов пачкой.
+        '''
+        queryset = queryset.defer('search_vector')
+        return queryset.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch(
+                'recipeingredientamount_set',
+                queryset=RecipeIngredientAmount.objects.select_related(
+                    'ingredient__measurement_unit'
+                ).order_by('id'),
+            ),
+        )
+
+    @staticmethod
+    def uses_fragments():
+        return fragments_enabled() or values_read_enabled()
+
+    def build_fragments(self, recipe_ids):
+        '''
+        Собирает общую часть представления рецептов: из плоских строк
+        .values() или, если это отключено, через ResipeSerializer.
+        '''
+        if values_read_enabled():
+            return RecipeValuesBuilder().build(recipe_ids)
+        return serialize_fragments(
+            self.plan_queryset(Recipe.objects.filter(pk__in=recipe_ids))
+        )
+
+    def render_recipes(self, recipes):
+        renderer = RecipeFragmentRenderer(
+            self.get_serializer_context(), use_cache=fragments_enabled()
+        )
+        return renderer.render(recipes, self.build_fragments)
+
+    def list(self, request, *args, **kwargs):
+        if not self.uses_fragments():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.render_recipes(page))
+        return Response(self.render_recipes(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.uses_fragments():
+            return super().retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        return Response(self.render_recipes((instance,))[0])
 
     def create(self, request, *args, **kwargs):
         serializer = ResipeEditSerializer(
@@ -231,10 +408,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
-        output_serializer = ResipeSerializer(
-            serializer.instance, context={'request': request})
         return Response(
-            output_serializer.data,
+            self.render_recipes((serializer.instance,))[0],
             status=status.HTTP_201_CREATED,
         )
 
@@ -245,10 +420,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        output_serializer = ResipeSerializer(serializer.instance)
         return Response(
-            output_serializer.data,
-            status=status.HTTP_200_OK,)
+            self.render_recipes((serializer.instance,))[0],
+            status=status.HTTP_200_OK,
+        )
 
     @decorators.action(
         methods=('post', 'delete',),
@@ -261,45 +436,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         '''
         Управление списком избранного.
         '''
-        user = request.user
-        recipe_id = kwargs.get('pk', 0)
-
-        if not Recipe.objects.filter(id=recipe_id).exists():
-            text = f'Recipe with id={recipe_id} does not exists'
-            return Response(
-                {'errors': text},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        recipe = Recipe.objects.get(id=recipe_id)
-        params = {
-            'recipe': recipe,
-            'user': user,
-        }
-
-        if request.method == 'POST':
-            obj, created = UserFavoriteRecipe.objects.get_or_create(**params)
-            if created:
-                serializer = ResipeShortSerializer(
-                    instance=recipe, context={'request': request})
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
-            return Response(
-                {'errors': 'The recipe is already add'},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if UserFavoriteRecipe.objects.filter(**params).exists():
-            obj = UserFavoriteRecipe.objects.get(**params)
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        return Response(
-            {'errors': 'The recipe is not add'},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+        return self.toggle_recipe(request, FAVORITES, kwargs.get('pk', 0))
 
     @decorators.action(
         methods=('post', 'delete',),
@@ -312,43 +449,99 @@ class RecipeViewSet(viewsets.ModelViewSet):
         '''
         Управление списком покупок.
         '''
-        user = request.user
-        recipe_id = kwargs.get('pk', 0)
+        return self.toggle_recipe(request, SHOPPING_CART, kwargs.get('pk', 0))
 
-        if not Recipe.objects.filter(id=recipe_id).exists():
-            text = f'Recipe with id={recipe_id} does not exists'
-            return Response(
-                {'errors': text},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    @decorators.action(
+        methods=('post', 'delete',),
+        permission_classes=(permissions.IsAuthenticated,),
+        detail=False,
+        url_path='favorite',
+        url_name='favorite_many',
+    )
+    def manage_favorites(self, request, *args, **kwargs):
+        '''
+        Массовое управление списком избранного.
+        '''
+        return self.toggle_recipes(request, FAVORITES)
 
-        recipe = Recipe.objects.get(id=recipe_id)
-        params = {
-            'recipe': recipe,
-            'user': user,
-        }
+    @decorators.action(
+        methods=('post', 'delete',),
+        permission_classes=(permissions.IsAuthenticated,),
+        detail=False,
+        url_path='shopping_cart',
+        url_name='shopping_cart_many',
+    )
+    def manage_shopping_carts(self, request, *args, **kwargs):
+        '''
+        Массовое управление списком покупок.
+        '''
+        return self.toggle_recipes(request, SHOPPING_CART)
+
+    @decorators.action(
+        methods=('delete',),
+        permission_classes=(permissions.IsAuthenticated,),
+        detail=False,
+        url_path='shopping_cart/clear',
+        url_name='shopping_cart_clear',
+    )
+    def clear_shopping_cart(self, request, *args, **kwargs):
+        '''
+        Очистка списка покупок.
+        '''
+        SHOPPING_CART.clear(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def toggle_recipes(request, toggle):
+        '''
+        Добавляет рецепты из ids в список toggle (POST) или убирает
+        их оттуда (DELETE) и возвращает исход по каждому id.
+        '''
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
         if request.method == 'POST':
-            obj, created = UserShoppingCart.objects.get_or_create(**params)
-            if created:
-                serializer = ResipeShortSerializer(
-                    instance=recipe, context={'request': request})
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
-                )
-            return Response(
-                {'errors': 'The recipe is already add'},
-                status=status.HTTP_400_BAD_REQUEST,
+            outcomes = toggle.add_many(request.user.pk, ids)
+        else:
+            outcomes = toggle.remove_many(request.user.pk, ids)
+        return Response({
+            'results': [
+                {'id': pk, 'status': outcome}
+                for pk, outcome in outcomes.items()
+            ],
+        })
+
+    @staticmethod
+    def toggle_recipe(request, toggle, recipe_id):
+        '''
+        Добавляет рецепт в список toggle (POST) или убирает из него
+        (DELETE). Удачный исход - одна команда к базе и, при
+        добавлении, чтение рецепта для ответа; проверка существования
+        рецепта нужна только при неудаче.
+        '''
+        pk = parse_pk(recipe_id)
+        if request.method == 'POST':
+            done = pk is not None and toggle.add(request.user.pk, pk)
+        else:
+            done = pk is not None and toggle.remove(request.user.pk, pk)
+
+        if done and request.method == 'POST':
+            serializer = ResipeShortSerializer(
+                instance=Recipe.objects.defer('search_vector').get(pk=pk),
+                context={'request': request},
             )
-
-        if UserShoppingCart.objects.filter(**params).exists():
-            obj = UserShoppingCart.objects.get(**params)
-            obj.delete()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if done:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+        if pk is None or not toggle.target_exists(pk):
+            text = f'Recipe with id={recipe_id} does not exists'
+        elif request.method == 'POST':
+            text = 'The recipe is already add'
+        else:
+            text = 'The recipe is not add'
         return Response(
-            {'errors': 'The recipe is not add'},
+            {'errors': text},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
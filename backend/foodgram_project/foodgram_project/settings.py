@@ -45,12 +45,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,6 +99,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# При DEBUG = 0 кэш должен быть общим для всех процессов
+# (api.checks): в нём хранятся счётчики изменений данных.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -148,6 +166,16 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -157,5 +185,36 @@ REST_FRAMEWORK = {
 PROJECT_SETTINGS = {
     'recipes_min_cooking_time': 1,
     'ingredient_min_amount': 1,
-    'users_validate_patter_username': r'^[\w.@+-]+\Z'
+    'users_validate_patter_username': r'^[\w.@+-]+\Z',
+    'pagination_count_cache_timeout': int(
+        os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', '60')),
+    'pagination_estimate_threshold': int(
+        os.getenv('PAGINATION_ESTIMATE_THRESHOLD', '100000')),
+    'recipe_fragment_cache': bool(int(
+        os.getenv('RECIPE_FRAGMENT_CACHE', '1'))),
+    'recipe_fragment_cache_timeout': int(
+        os.getenv('RECIPE_FRAGMENT_CACHE_TIMEOUT', '3600')),
+    'ingredient_index': bool(int(os.getenv('INGREDIENT_INDEX', '1'))),
+    'recipe_values_read': bool(int(os.getenv('RECIPE_VALUES_READ', '1'))),
+    'catalogue_prerender': bool(int(os.getenv('CATALOGUE_PRERENDER', '1'))),
+    'ingredient_fuzzy_limit': int(os.getenv('INGREDIENT_FUZZY_LIMIT', '20')),
+    'server_timing': bool(int(os.getenv('SERVER_TIMING', '0'))),
+    'server_timing_debug': bool(int(os.getenv('SERVER_TIMING_DEBUG', '0'))),
+    'slow_request_ms': int(os.getenv('SLOW_REQUEST_MS', '500')),
+    'slow_request_queries': int(os.getenv('SLOW_REQUEST_QUERIES', '30')),
+    'metrics': bool(int(os.getenv('METRICS', '1'))),
+    'metrics_dir': os.getenv('METRICS_DIR', ''),
+    'metrics_flush_interval': float(os.getenv('METRICS_FLUSH_INTERVAL', '5')),
+    'metrics_allowed_networks': os.getenv(
+        'METRICS_ALLOWED_NETWORKS',
+        '127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16',
+    ).split(','),
+    'bulk_toggle_max_ids': int(os.getenv('BULK_TOGGLE_MAX_IDS', '100')),
+    'image_workers': int(os.getenv('IMAGE_WORKERS', '2')),
+    'image_max_upload_bytes': int(
+        os.getenv('IMAGE_MAX_UPLOAD_BYTES', str(10 * 1024 * 1024))),
+    'image_max_pixels': int(os.getenv('IMAGE_MAX_PIXELS', '25000000')),
+    'image_max_side': 1600,
+    'image_thumbnail_side': 400,
+    'image_quality': 85,
 }
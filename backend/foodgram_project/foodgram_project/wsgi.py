@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from api.startup import start_worker
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_project.settings')
 
 application = get_wsgi_application()
+start_worker()
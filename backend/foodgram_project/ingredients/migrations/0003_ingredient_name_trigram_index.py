@@ -0,0 +1,39 @@
+from django.db import migrations
+
+CREATE_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+    '''
+    CREATE INDEX IF NOT EXISTS ingredients_ingredient_name_trgm_idx
+    ON ingredients_ingredient USING gin (name gin_trgm_ops);
+    ''',
+)
+
+DROP_SQL = (
+    'DROP INDEX IF EXISTS ingredients_ingredient_name_trgm_idx;',
+)
+
+
+def run_on_postgresql(statements):
+    '''
+    Триграммный GIN-индекс есть только в PostgreSQL,
+    в остальных базах нечёткий поиск работает без него.
+    '''
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0002_auto_20220526_2009'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SQL), run_on_postgresql(DROP_SQL)
+        ),
+    ]
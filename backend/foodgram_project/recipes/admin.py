@@ -34,6 +34,9 @@ class RecipeAdmin(admin.ModelAdmin):
         'text',
         'cooking_time',
         'image',
+        'image_state',
+        'favorites_count',
+        'in_cart_count',
     )
     list_editable = (
         'author',
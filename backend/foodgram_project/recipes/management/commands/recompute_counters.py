@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.signals import COUNTERS as RECIPES_COUNTERS
+from users.signals import COUNTERS as USERS_COUNTERS
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт денормализованных счётчиков рецептов и пользователей'
+
+    def handle(self, *args, **kwargs):
+        '''
+        Основная функция выполнения команды.
+        '''
+        for counter in RECIPES_COUNTERS + USERS_COUNTERS:
+            with transaction.atomic():
+                updated = counter.recompute()
+            self.stdout.write(f'{counter}: {updated} rows recomputed')
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.20 on 2026-10-18 01:38
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_related(apps, target, source, fk_name, field):
+    Target = apps.get_model(*target.split('.'))
+    Source = apps.get_model(*source.split('.'))
+    totals = (
+        Source.objects
+        .filter(**{fk_name: models.OuterRef('pk')})
+        .order_by()
+        .values(fk_name)
+        .annotate(total=models.Count('pk'))
+        .values('total')
+    )
+    Target.objects.update(**{
+        field: Coalesce(
+            models.Subquery(totals, output_field=models.IntegerField()), 0
+        )
+    })
+
+
+def fill_counters(apps, schema_editor):
+    count_related(apps, 'users.User', 'recipes.Recipe', 'author',
+                  'recipes_count')
+    count_related(apps, 'recipes.Recipe', 'recipes.UserFavoriteRecipe',
+                  'recipe', 'favorites_count')
+    count_related(apps, 'recipes.Recipe', 'recipes.UserShoppingCart',
+                  'recipe', 'in_cart_count')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_auto_20261018_0133'),
+        ('users', '0006_auto_20261018_0138'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Число пользователей, добавивших рецепт в избранное', verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Число пользователей, добавивших рецепт в покупки', verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
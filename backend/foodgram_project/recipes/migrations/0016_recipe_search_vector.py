@@ -0,0 +1,75 @@
+# Generated by Django 2.2.20 on 2026-10-18 01:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('pg_catalog.russian', "
+    "coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('pg_catalog.russian', "
+    "coalesce({row}text, '')), 'B')"
+)
+
+CREATE_SQL = (
+    '''
+    CREATE FUNCTION recipes_recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {vector};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    '''.format(vector=SEARCH_VECTOR_SQL.format(row='NEW.')),
+    '''
+    CREATE TRIGGER recipes_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+    FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update();
+    ''',
+    'UPDATE recipes_recipe SET search_vector = {vector};'.format(
+        vector=SEARCH_VECTOR_SQL.format(row='')
+    ),
+    '''
+    CREATE INDEX recipes_recipe_search_vector_idx
+    ON recipes_recipe USING gin (search_vector);
+    ''',
+)
+
+DROP_SQL = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_idx;',
+    '''
+    DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger
+    ON recipes_recipe;
+    ''',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update();',
+)
+
+
+def run_on_postgresql(statements):
+    '''
+    Триггер и GIN-индекс есть только в PostgreSQL,
+    в остальных базах поиск работает без них.
+    '''
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_auto_20261018_0140'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Заполняется триггером PostgreSQL по name и text', null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SQL), run_on_postgresql(DROP_SQL)
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.20 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_raw',
+            field=models.FileField(blank=True, editable=False, help_text='Исходный файл до фоновой обработки', upload_to='recipes/raw/', verbose_name='Загруженная картинка'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_state',
+            field=models.CharField(choices=[('pending', 'Обрабатывается'), ('ready', 'Готова'), ('failed', 'Ошибка обработки')], default='ready', editable=False, max_length=10, verbose_name='Обработка картинки'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='recipes/thumbnails/', verbose_name='Миниатюра'),
+        ),
+    ]
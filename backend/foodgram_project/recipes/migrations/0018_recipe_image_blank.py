@@ -0,0 +1,18 @@
+# Generated by Django 2.2.20 on 2026-10-18 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_recipe_image_processing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Пуста, пока первая загруженная картинка обрабатывается', upload_to='recipes/', verbose_name='Картинка'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from foodgram_project.settings import PROJECT_SETTINGS
@@ -7,6 +8,15 @@ from tags.models import Tag
 
 User = get_user_model()
 
+IMAGE_PENDING = 'pending'
+IMAGE_READY = 'ready'
+IMAGE_FAILED = 'failed'
+IMAGE_STATES = (
+    (IMAGE_PENDING, 'Обрабатывается'),
+    (IMAGE_READY, 'Готова'),
+    (IMAGE_FAILED, 'Ошибка обработки'),
+)
+
 
 class Recipe(models.Model):
     '''
@@ -39,7 +49,29 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         'Картинка',
+        help_text='Пуста, пока первая загруженная картинка обрабатывается',
         upload_to='recipes/',
+        blank=True,
+    )
+    image_thumbnail = models.ImageField(
+        'Миниатюра',
+        upload_to='recipes/thumbnails/',
+        blank=True,
+        editable=False,
+    )
+    image_raw = models.FileField(
+        'Загруженная картинка',
+        help_text='Исходный файл до фоновой обработки',
+        upload_to='recipes/raw/',
+        blank=True,
+        editable=False,
+    )
+    image_state = models.CharField(
+        'Обработка картинки',
+        max_length=10,
+        choices=IMAGE_STATES,
+        default=IMAGE_READY,
+        editable=False,
     )
     tags = models.ManyToManyField(
         Tag,
@@ -53,11 +85,33 @@ class Recipe(models.Model):
         verbose_name='Список ингредиентов',
         help_text='Список ингредиентов'
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        help_text='Число пользователей, добавивших рецепт в избранное',
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    in_cart_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        help_text='Число пользователей, добавивших рецепт в покупки',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        help_text='Заполняется триггером PostgreSQL по name и text',
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('name',)
+        indexes = (
+            models.Index(fields=('name', 'id'), name='recipe_name_id_idx'),
+        )
 
     def __str__(self) -> str:
         return f'Рецепт: {self.name}'
@@ -81,7 +135,7 @@ class RecipeTag(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Тег',
         help_text='Тег',
-        db_index=True,
+        db_index=False,
     )
 
     class Meta:
@@ -93,6 +147,11 @@ class RecipeTag(models.Model):
                 name='unigue_tag_for_recipe'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('tag', 'recipe'), name='recipetag_tag_recipe_idx'
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.recipe}, {self.tag}'
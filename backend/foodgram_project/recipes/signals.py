@@ -0,0 +1,20 @@
+from django.dispatch import Signal
+
+from recipes.models import Recipe, UserFavoriteRecipe, UserShoppingCart
+from users.counters import Counter
+
+COUNTERS = (
+    Counter(Recipe, 'author', 'recipes_count'),
+    Counter(UserFavoriteRecipe, 'recipe', 'favorites_count'),
+    Counter(UserShoppingCart, 'recipe', 'in_cart_count'),
+)
+
+# Массовая запись (bulk_create, update, delete у queryset) не вызывает
+# post_save и post_delete, поэтому после неё отправляется bulk_changed:
+# sender - изменённая модель, recipe_ids - id затронутых рецептов.
+bulk_changed = Signal()
+
+
+def connect_signals():
+    for counter in COUNTERS:
+        counter.connect()
@@ -1,8 +1,10 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase, override_settings
 from ingredients.models import Ingredient, MeasurementUnit
 from recipes.models import (Recipe, RecipeIngredientAmount, RecipeTag,
@@ -306,3 +308,40 @@ class RecipeModelsTest(TestCase):
                         f'вместо {expected_value}'
                     )
                 )
+
+    def test_recipes_models_counters(self):
+        '''
+        Проверяем поддержку счётчиков и их пересчёт командой.
+        '''
+        recipe: Recipe = RecipeModelsTest.recipe
+        user: User = RecipeModelsTest.user
+        other = User.objects.create_user(
+            username='other', email='other@test_domain.info',
+            first_name='Другой', last_name='Тестович', password='test_123',
+        )
+        recipe.refresh_from_db()
+        user.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.in_cart_count, 1)
+        self.assertEqual(user.recipes_count, 1)
+
+        UserFavoriteRecipe.objects.create(user=other, recipe=recipe)
+        RecipeModelsTest.shop_recipe.delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 2)
+        self.assertEqual(recipe.in_cart_count, 0)
+
+        recipe.author = other
+        recipe.save()
+        user.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(user.recipes_count, 0)
+        self.assertEqual(other.recipes_count, 1)
+
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=100)
+        User.objects.filter(pk=other.pk).update(recipes_count=7)
+        call_command('recompute_counters', stdout=StringIO())
+        recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 2)
+        self.assertEqual(other.recipes_count, 1)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     name = 'users'
     verbose_name = 'Управление пользователями'
+
+    def ready(self):
+        from users.signals import connect_signals
+        connect_signals()
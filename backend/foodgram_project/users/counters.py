@@ -0,0 +1,103 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+
+
+def change_counter(model, pk, field, delta):
+    '''
+    Изменяет счётчик field у объекта model на delta одним UPDATE.
+    '''
+    if pk is None or not delta:
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+class Counter:
+    '''
+    Класс Counter.
+
+    Поддерживает в модели, на которую ссылается внешний ключ fk_name
+    модели source, число ссылающихся на неё объектов в поле field.
+    '''
+    def __init__(self, source, fk_name, field):
+        self.source = source
+        self.fk = source._meta.get_field(fk_name)
+        self.target = self.fk.related_model
+        self.field = field
+        self.previous_attr = f'_counter_previous_{self.fk.attname}'
+
+    def __str__(self):
+        return f'{self.target._meta.label}.{self.field}'
+
+    def connect(self):
+        uid = f'counter_{self.source._meta.label_lower}_{self.field}'
+        pre_save.connect(self.remember, sender=self.source, dispatch_uid=uid)
+        post_save.connect(self.saved, sender=self.source, dispatch_uid=uid)
+        post_delete.connect(
+            self.deleted, sender=self.source, dispatch_uid=uid
+        )
+
+    def change(self, pk, delta):
+        change_counter(self.target, pk, self.field, delta)
+
+    def change_many(self, pks, delta):
+        '''
+        Изменяет счётчик у объектов pks на delta одним UPDATE.
+        '''
+        if not pks or not delta:
+            return
+        self.target.objects.filter(pk__in=pks).update(
+            **{self.field: Greatest(F(self.field) + delta, 0)}
+        )
+
+    def remember(self, sender, instance, update_fields=None, **kwargs):
+        '''
+        Запоминает прежнее значение внешнего ключа, чтобы перенос
+        объекта на другую запись (например, в админке) учёлся.
+        '''
+        if instance._state.adding:
+            return
+        if update_fields is not None and self.fk.name not in update_fields:
+            return
+        previous = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list(self.fk.attname, flat=True).first()
+        )
+        setattr(instance, self.previous_attr, previous)
+
+    def saved(self, sender, instance, created, **kwargs):
+        current = getattr(instance, self.fk.attname)
+        if created:
+            self.change(current, 1)
+            return
+        previous = instance.__dict__.pop(self.previous_attr, current)
+        if previous != current:
+            self.change(previous, -1)
+            self.change(current, 1)
+
+    def deleted(self, sender, instance, **kwargs):
+        self.change(getattr(instance, self.fk.attname), -1)
+
+    def recompute(self, pks=None) -> int:
+        '''
+        Пересчитывает счётчик у объектов pks (по умолчанию у всех)
+        одним UPDATE.
+        '''
+        totals = (
+            self.source.objects
+            .filter(**{self.fk.name: OuterRef('pk')})
+            .order_by()
+            .values(self.fk.name)
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        targets = self.target.objects.all()
+        if pks is not None:
+            targets = targets.filter(pk__in=pks)
+        return targets.update(**{
+            self.field: Coalesce(
+                Subquery(totals, output_field=IntegerField()), 0
+            )
+        })
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.20 on 2026-10-18 01:38
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_related(apps, target, source, fk_name, field):
+    Target = apps.get_model(*target.split('.'))
+    Source = apps.get_model(*source.split('.'))
+    totals = (
+        Source.objects
+        .filter(**{fk_name: models.OuterRef('pk')})
+        .order_by()
+        .values(fk_name)
+        .annotate(total=models.Count('pk'))
+        .values('total')
+    )
+    Target.objects.update(**{
+        field: Coalesce(
+            models.Subquery(totals, output_field=models.IntegerField()), 0
+        )
+    })
+
+
+def fill_counters(apps, schema_editor):
+    count_related(apps, 'users.User', 'users.SubscribeUser', 'author',
+                  'followers_count')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_auto_20220531_1926'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Число подписчиков', verbose_name='Число подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Число рецептов', verbose_name='Число рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -27,6 +27,18 @@ class User(AbstractUser):
         max_length=150,
         unique=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Число рецептов',
+        help_text='Число рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        help_text='Число подписчиков',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
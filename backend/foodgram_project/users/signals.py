@@ -0,0 +1,11 @@
+from users.counters import Counter
+from users.models import SubscribeUser
+
+COUNTERS = (
+    Counter(SubscribeUser, 'author', 'followers_count'),
+)
+
+
+def connect_signals():
+    for counter in COUNTERS:
+        counter.connect()